@@ -0,0 +1,183 @@
+import argparse
+import statistics
+from collections import Counter
+from functools import partial
+from multiprocessing import Pool
+from os import cpu_count
+from time import perf_counter
+
+from pacman_lib import *
+
+REVERSE = {Direction.LEFT: Direction.RIGHT, Direction.RIGHT: Direction.LEFT,
+           Direction.UP: Direction.DOWN, Direction.DOWN: Direction.UP,
+           Direction.STOPPED: Direction.STOPPED}
+# The cause of a game the autopilot got stuck in, a failure rather than a result
+STALLED = 'stalled'
+STEPS = {Direction.LEFT: (0, -1), Direction.RIGHT: (0, 1), Direction.UP: (-1, 0), Direction.DOWN: (1, 0)}
+
+
+class Autopilot:
+    # Stands in for the keyboard: at each new cell Pac-Man takes a random open
+    # way on, preferring cells that still hold a pill, and only turns back at dead ends
+    def __init__(self, engine: PacmanEngine) -> None:
+        super().__init__()
+        self.engine = engine
+        self.last_cell = None
+
+    def is_open(self, row: int, col: int):
+        # Off the grid counts as blocked, or Pac-Man drives out through the
+        # tunnel and gets pinned against the clamp where no cell holds him
+        grid = self.engine.pacman_grid
+        return 0 <= row < len(grid) and 0 <= col < len(grid[0]) and grid[row][col] != WALL
+
+    def steer(self):
+        engine = self.engine
+        first_row, last_row, first_col, last_col = engine.layout.cells_touching(engine.pacman.sprite.bbox())
+        if first_row != last_row or first_col != last_col or (first_row, first_col) == self.last_cell:
+            return
+        self.last_cell = (first_row, first_col)
+        mover = engine.pacman.mover
+        options = [direction for direction, (row_step, col_step) in STEPS.items()
+                   if direction is not REVERSE[mover.direction]
+                   and self.is_open(first_row + row_step, first_col + col_step)]
+        if not options:
+            mover.direction = REVERSE[mover.direction]
+            return
+        pills = [direction for direction in options
+                 if (first_row + STEPS[direction][0], first_col + STEPS[direction][1]) in engine.pills]
+        mover.direction = engine.random.choice(pills or options)
+
+
+class GameResult:
+    __slots__ = ('seed', 'state', 'ticks', 'pills_eaten', 'pills_left', 'cause')
+
+    def __init__(self, seed: int, state: GameState, ticks: int, pills_eaten: int, pills_left: int,
+                 cause: str) -> None:
+        self.seed = seed
+        self.state = state
+        self.ticks = ticks
+        self.pills_eaten = pills_eaten
+        self.pills_left = pills_left
+        self.cause = cause
+
+    def __str__(self) -> str:
+        return "seed: {}, state: {}, ticks: {}, pills eaten: {}, cause: {}".format(
+            self.seed, self.state.value, self.ticks, self.pills_eaten, self.cause)
+
+
+def run_game(seed: int, max_ticks: int = 20_000, step: int = 8, grid: list = None,
+             monster_speed: int = None, monster_delay: int = None,
+             chase: bool = False, vectorized: bool = False, stall_ticks: int = 1_000):
+    # One whole game with no window and no frame delay, as fast as the CPU allows.
+    # A Pac-Man that has not moved for stall_ticks is stuck, the game ends as "stalled"
+    engine = PacmanEngine(grid=grid, seed=seed, chase=chase, vectorized=vectorized)
+    engine.set_monster_speed(monster_speed, monster_delay)
+    engine.pacman.mover.direction = Direction.RIGHT
+    autopilot = Autopilot(engine)
+    cause = None
+    sprite = engine.pacman.sprite
+    position = (sprite.x, sprite.y)
+    moved_at = 0
+    while engine.state is GameState.PLAYING and engine.ticks < max_ticks:
+        autopilot.steer()
+        engine.step(step)
+        if (sprite.x, sprite.y) != position:
+            position = (sprite.x, sprite.y)
+            moved_at = engine.ticks
+        elif engine.ticks - moved_at >= stall_ticks:
+            cause = STALLED
+            break
+    if engine.state is GameState.LOST:
+        catcher = engine.catcher()
+        cause = catcher.sprite.border_color if catcher is not None else 'unknown'
+    elif engine.state is GameState.PLAYING and cause is None:
+        cause = 'timeout'
+    return GameResult(seed, engine.state, engine.ticks, engine.pills_eaten, engine.number_of_pills, cause)
+
+
+class BatchReport:
+    def __init__(self, results: list, elapsed: float, workers: int) -> None:
+        super().__init__()
+        self.results = sorted(results, key=lambda result: result.seed)
+        self.elapsed = elapsed
+        self.workers = workers
+
+    @property
+    def games(self):
+        return len(self.results)
+
+    @property
+    def outcomes(self):
+        return Counter(result.state.value for result in self.results)
+
+    @property
+    def causes(self):
+        return Counter(result.cause for result in self.results if result.cause is not None)
+
+    @property
+    def stalled(self):
+        return [result.seed for result in self.results if result.cause == STALLED]
+
+    @property
+    def ticks(self):
+        # Stalled games are left out, their length says nothing about the game
+        return [result.ticks for result in self.results if result.cause != STALLED]
+
+    @property
+    def pills_eaten(self):
+        return [result.pills_eaten for result in self.results if result.cause != STALLED]
+
+    @property
+    def throughput(self):
+        return sum(self.ticks) / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self) -> str:
+        ticks = self.ticks or [0]
+        pills = self.pills_eaten or [0]
+        lines = [f'{self.games} games on {self.workers} processes in {self.elapsed:.2f} s '
+                 f'({self.games / self.elapsed:.1f} games/s, {self.throughput:,.0f} ticks/s)',
+                 'outcomes: ' + ', '.join(f'{name} {count}' for name, count in self.outcomes.most_common()),
+                 'causes:   ' + ', '.join(f'{name} {count}' for name, count in self.causes.most_common()),
+                 f'ticks survived: mean {statistics.mean(ticks):.0f}, median {statistics.median(ticks):.0f}, '
+                 f'min {min(ticks)}, max {max(ticks)}',
+                 f'pills eaten:    mean {statistics.mean(pills):.1f}, median {statistics.median(pills):.0f}, '
+                 f'min {min(pills)}, max {max(pills)}']
+        if self.stalled:
+            lines.append(f'FAILED, autopilot stuck in {len(self.stalled)} games, seeds '
+                         + ', '.join(map(str, self.stalled)))
+        return '\n'.join(lines)
+
+
+def run_batch(games: int, workers: int = None, first_seed: int = 0, **options):
+    # Games are independent, so each process just takes a slice of the seeds
+    # and only the small GameResults travel back
+    workers = workers or cpu_count() or 1
+    seeds = range(first_seed, first_seed + games)
+    play = partial(run_game, **options)
+    start = perf_counter()
+    if workers == 1:
+        results = [play(seed) for seed in seeds]
+    else:
+        with Pool(workers) as pool:
+            results = list(pool.imap_unordered(play, seeds, chunksize=max(1, games // (workers * 4))))
+    return BatchReport(results, perf_counter() - start, workers)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play many seeded headless games and report the results')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=None, help='processes, defaults to one per core')
+    parser.add_argument('--first-seed', type=int, default=0)
+    parser.add_argument('--max-ticks', type=int, default=20_000)
+    parser.add_argument('--step', type=int, default=8, help='simulated milliseconds per tick')
+    parser.add_argument('--monster-speed', type=int, default=None)
+    parser.add_argument('--monster-delay', type=int, default=None)
+    parser.add_argument('--chase', action='store_true', help='monsters chase Pac-Man instead of wandering')
+    parser.add_argument('--vectorized', action='store_true')
+    parser.add_argument('--stall-ticks', type=int, default=1_000, help='ticks without moving that count as stuck')
+    args = parser.parse_args()
+    report = run_batch(args.games, args.workers, args.first_seed, max_ticks=args.max_ticks, step=args.step,
+                       monster_speed=args.monster_speed, monster_delay=args.monster_delay,
+                       chase=args.chase, vectorized=args.vectorized, stall_ticks=args.stall_ticks)
+    print(report)
+    raise SystemExit(1 if report.stalled else 0)
@@ -0,0 +1,381 @@
+import argparse
+import statistics
+import tracemalloc
+from collections import Counter
+from time import perf_counter
+
+from spritelib_v4 import *
+from game_gui_lib import *
+from batch_sim import Autopilot
+from mazegen import *
+
+
+class DictBacked:
+    # Holds the same fields in an instance __dict__, the way the classes
+    # were laid out before they got __slots__
+    pass
+
+
+def as_dict_backed(obj):
+    copy = DictBacked()
+    for name in type(obj).__slots__:
+        setattr(copy, name, getattr(obj, name))
+    return copy
+
+
+def traced_bytes_per_item(factory, count: int):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = [factory(i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    list_bytes = 8 * len(items)
+    return (after - before - list_bytes) / count
+
+
+def memory_footprint(count: int = 100_000):
+    sprite = Sprite(3, 3, 16, 16, border_color="red", border_width=0)
+    samples = {
+        'Point': lambda i: Point(i, i),
+        'Sprite': lambda i: Sprite(i, i, 16, 16, border_color="red", border_width=0),
+        'Mover': lambda i: Mover(sprite, Direction.UP, 25, 3),
+        'Animation': lambda i: Animation(sprite, [], 100),
+    }
+    results = []
+    for name, factory in samples.items():
+        slotted = traced_bytes_per_item(factory, count)
+        originals = [factory(i) for i in range(count)]
+        dict_backed = traced_bytes_per_item(lambda i: as_dict_backed(originals[i]), count)
+        results.append((name, dict_backed, slotted))
+    return results
+
+
+def print_memory_footprint(count: int = 100_000):
+    print(f'Per-object memory, {count} objects each')
+    print(f'{"class":<12}{"__dict__":>12}{"__slots__":>12}{"saved":>10}')
+    for name, dict_backed, slotted in memory_footprint(count):
+        saved = 1 - slotted / dict_backed
+        print(f'{name:<12}{dict_backed:>10.0f} B{slotted:>10.0f} B{saved:>10.0%}')
+
+
+class FakeImage:
+    # Just enough of a PhotoImage for Sprite and Animation
+    def __init__(self, width: int, height: int) -> None:
+        super().__init__()
+        self._width = width
+        self._height = height
+
+    def width(self):
+        return self._width
+
+    def height(self):
+        return self._height
+
+
+class FakeCanvas:
+    # Stands in for a Tk Canvas with no display, counting every call made to it
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls = Counter()
+        self._items = 0
+        # CanvasBatch talks to Tcl through canvas.tk, those calls are counted as well
+        self.tk = self
+        self._w = '.canvas'
+
+    def _create(self, kind: str):
+        self.calls[kind] += 1
+        self._items += 1
+        return self._items
+
+    def create_rectangle(self, *args, **kwargs):
+        return self._create('create_rectangle')
+
+    def create_image(self, *args, **kwargs):
+        return self._create('create_image')
+
+    def create_text(self, *args, **kwargs):
+        return self._create('create_text')
+
+    def find_withtag(self, tag):
+        self.calls['find_withtag'] += 1
+        return ()
+
+    def __getattr__(self, name):
+        # coords, itemconfig, delete and anything else only get counted
+        def call(*args, **kwargs):
+            self.calls[name] += 1
+        return call
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+
+class NullSounds:
+    def trigger(self, name):
+        pass
+
+    def flush(self):
+        pass
+
+    def play_music(self):
+        pass
+
+    def stop_music(self):
+        pass
+
+
+def headless_root():
+    # A Tcl interpreter without Tk, the few Tk commands a screen is built
+    # with do nothing and after() queues events that never run
+    root = Tcl()
+    root.tk.eval('proc frame args {}; proc bind args {}; proc winfo args {return .}')
+    return root
+
+
+class BenchScreen(PacmanGameScreen):
+    # PacmanGameScreen built by its own constructor, without a display:
+    # the canvas counts calls, the images are sizes only and Pac-Man drives himself
+    def __init__(self, engine: PacmanEngine, retained: bool = True, step: int = 8,
+                 profile: bool = False, batch: bool = False, culled: bool = True) -> None:
+        # Needed by update, which the constructor ends with
+        self.autopilot = Autopilot(engine)
+        self.fake_canvas = FakeCanvas()
+        # The stock window, or with culled=False one as big as the world so everything is drawn
+        width, height = (452, 500) if culled else (engine.world_width, engine.world_height)
+        super().__init__(headless_root(), NullController(), canvas_width=width, canvas_height=height,
+                         retained=retained, fixed_step=step, profile=profile, record=False, batch=batch,
+                         engine=engine, canvas_factory=lambda master, **options: self.fake_canvas)
+        self.delta_time = step
+
+    def load_assets(self):
+        self.bg_image = FakeImage(452, 500)
+        self.redghost_image = FakeImage(12, 12)
+        self.ghost_images = {}
+        closed_image = FakeImage(12, 12)
+        self.pacman_images = {direction: [closed_image, FakeImage(12, 12)]
+                              for direction in ("Left", "Right", "Up", "Down")}
+
+    def bake_static_layer(self):
+        # Blank chunks, a real one would need PIL and Tk to composite
+        self.static_layer.clear()
+        size = self.static_layer.chunk_size
+        width = self.camera.world_width
+        height = self.camera.world_height
+        for y in range(0, height, size):
+            for x in range(0, width, size):
+                self.static_layer.add(Sprite(x, y, border_width=0,
+                                             image=FakeImage(min(size, width - x), min(size, height - y))))
+
+    def update(self):
+        self.autopilot.steer()
+        super().update()
+
+    def stop(self):
+        # Keep playing through lost games so every frame costs the same, only a
+        # cleared maze starts over
+        if self.engine.state is GameState.WON:
+            self.engine.reset()
+            self.show_map()
+            self.autopilot.last_cell = None
+        self.engine.state = GameState.PLAYING
+
+
+class NullController:
+    def __init__(self) -> None:
+        self.scheduler = self
+        self.sounds = NullSounds()
+
+    def show_frame(self, name):
+        pass
+
+    def call_later(self, *args, **kwargs):
+        pass
+
+
+def tiled_grid(copies_x: int, copies_y: int):
+    # The stock maze repeated, with the shared border walls kept
+    stock = pacman_grid()
+    rows = []
+    for copy_y in range(copies_y):
+        for row in stock[1:] if copy_y else stock:
+            rows.append(row[:1] + row[1:] * copies_x)
+    return rows
+
+
+def open_grid(rows: int, columns: int):
+    # One big room full of pills
+    grid = [[PILL] * columns for _ in range(rows)]
+    grid[0] = [WALL] * columns
+    grid[-1] = [WALL] * columns
+    for row in grid:
+        row[0] = WALL
+        row[-1] = WALL
+    return grid
+
+
+def add_ghosts(engine: PacmanEngine, count: int):
+    # Spread extra monsters over random open cells
+    open_cells = [(row, col) for row, cells in enumerate(engine.pacman_grid)
+                  for col, cell in enumerate(cells) if cell != WALL]
+    for row, col in engine.random.sample(open_cells, min(count, len(open_cells))):
+        left, top, right, bottom = engine.layout.cell_bbox(row, col)
+        engine.add_monster(left + 2, top + 2)
+    return engine
+
+
+def scenario_engine(grid: list = None, ghosts: int = 0, **options):
+    engine = PacmanEngine(grid=grid, seed=1, **options)
+    add_ghosts(engine, ghosts)
+    return engine.fit_clamps()
+
+
+SCENARIOS = {
+    'stock maze': lambda: scenario_engine(),
+    'stock, chase': lambda: scenario_engine(chase=True),
+    '64 ghosts': lambda: scenario_engine(ghosts=60),
+    '512 ghosts': lambda: scenario_engine(ghosts=508),
+    '512 ghosts, numpy': lambda: scenario_engine(ghosts=508, vectorized=True),
+    'maze 4x4': lambda: scenario_engine(tiled_grid(4, 4), ghosts=60),
+    'maze 16x16': lambda: scenario_engine(tiled_grid(16, 16), ghosts=60),
+    'pills 200x200': lambda: scenario_engine(open_grid(200, 200), ghosts=60),
+    'generated 256x256': lambda: scenario_engine(level=generate_level(256, 256, 1,
+                                                                      ghost_density=CLASSIC_GHOST_DENSITY)),
+}
+
+
+class FrameResult:
+    def __init__(self, name: str, frames: int, ticks: int, update_times: list, draw_times: list,
+                 calls: Counter, first_frame_calls: int, allocated: float, phases: str = None,
+                 saved: float = 0) -> None:
+        super().__init__()
+        self.name = name
+        self.frames = frames
+        self.ticks = ticks
+        self.update_times = update_times
+        self.draw_times = draw_times
+        self.calls = calls
+        self.first_frame_calls = first_frame_calls
+        self.allocated = allocated
+        self.phases = phases
+        self.saved = saved
+
+    @property
+    def frame_times(self):
+        return [update + draw for update, draw in zip(self.update_times, self.draw_times)]
+
+    @property
+    def calls_per_frame(self):
+        return sum(self.calls.values()) / self.frames
+
+    def __str__(self) -> str:
+        frame_times = sorted(self.frame_times)
+        p95 = frame_times[int(len(frame_times) * 0.95)]
+        return (f'{self.name:<20}{statistics.mean(frame_times) * 1000:>9.3f}{p95 * 1000:>9.3f}'
+                f'{statistics.mean(self.update_times) * 1000:>9.3f}{statistics.mean(self.draw_times) * 1000:>9.3f}'
+                f'{self.calls_per_frame:>9.1f}{self.first_frame_calls:>10}{self.allocated:>10.0f}')
+
+
+def draw_frame(screen: BenchScreen):
+    screen.draw()
+    if screen.batch:
+        screen.canvas.end_frame()
+
+
+def run_frames(screen: BenchScreen, frames: int, steps_per_frame: int):
+    update_times = []
+    draw_times = []
+    profiler = screen.profiler
+    for _ in range(frames):
+        if profiler is not None:
+            profiler.begin_frame()
+        start = perf_counter()
+        for _ in range(steps_per_frame):
+            screen.update()
+        middle = perf_counter()
+        draw_frame(screen)
+        update_times.append(middle - start)
+        draw_times.append(perf_counter() - middle)
+        if profiler is not None:
+            profiler.lap('draw', middle)
+            profiler.end_frame()
+    return update_times, draw_times
+
+
+def traced_bytes_per_tick(screen: BenchScreen, ticks: int):
+    # Peak memory above the starting point within each tick, i.e. what the
+    # tick allocated even if it was freed again before the tick ended
+    total = 0
+    tracemalloc.start()
+    for _ in range(ticks):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        screen.update()
+        draw_frame(screen)
+        total += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return total / ticks
+
+
+def frame_benchmark(name: str, make_engine, frames: int = 200, steps_per_frame: int = 2,
+                    retained: bool = True, step: int = 8, profile: bool = False, batch: bool = False,
+                    culled: bool = True):
+    # The constructor draws the first frame, which creates every canvas item,
+    # so everything up to here is counted apart from the steady state
+    screen = BenchScreen(make_engine(), retained, step, profile, batch, culled)
+    if batch:
+        screen.canvas.end_frame()
+    first_frame_calls = screen.fake_canvas.total_calls
+    run_frames(screen, 10, steps_per_frame)
+    screen.fake_canvas.calls.clear()
+    saved_before = screen.canvas.total_saved if batch else 0
+    update_times, draw_times = run_frames(screen, frames, steps_per_frame)
+    calls = Counter(screen.fake_canvas.calls)
+    saved = (screen.canvas.total_saved - saved_before) / frames if batch else 0
+    # Timed before tracemalloc starts, which would slow every phase down
+    phases = screen.profiler.report() if profile else None
+    allocated = traced_bytes_per_tick(screen, 20)
+    return FrameResult(name, frames, frames * steps_per_frame, update_times, draw_times,
+                       calls, first_frame_calls, allocated, phases, saved)
+
+
+def frame_benchmarks(scenarios: dict = None, frames: int = 200, retained: bool = True, profile: bool = False,
+                     batch: bool = False, culled: bool = True):
+    scenarios = SCENARIOS if scenarios is None else scenarios
+    return [frame_benchmark(name, make_engine, frames, retained=retained, profile=profile, batch=batch,
+                            culled=culled)
+            for name, make_engine in scenarios.items()]
+
+
+def print_frame_benchmarks(frames: int = 200, retained: bool = True, names: list = None, profile: bool = False,
+                           batch: bool = False, culled: bool = True):
+    scenarios = {name: make_engine for name, make_engine in SCENARIOS.items() if not names or name in names}
+    print(f'Frame cost, {frames} frames of 2 ticks each, {"retained" if retained else "immediate"} drawing'
+          + (', batched' if batch else '') + ('' if culled else ', whole world in view'))
+    print(f'{"scenario":<20}{"frame ms":>9}{"p95 ms":>9}{"update":>9}{"draw":>9}'
+          f'{"calls":>9}{"1st frame":>10}{"B/tick":>10}')
+    for result in frame_benchmarks(scenarios, frames, retained, profile, batch, culled):
+        print(result)
+        print(f'{"":<20}' + ', '.join(f'{name} {count / result.frames:.1f}'
+                                      for name, count in result.calls.most_common()))
+        if batch:
+            print(f'{"":<20}tcl calls saved {result.saved:.1f}')
+        if result.phases is not None:
+            print('\n'.join(f'{"":<20}{line}' for line in result.phases.splitlines()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Memory and per-frame benchmarks, no display needed')
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--immediate', action='store_true', help='delete and redraw everything each frame')
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS), help='run only these')
+    parser.add_argument('--memory', action='store_true', help='also measure per-object memory')
+    parser.add_argument('--profile', action='store_true', help='break each frame down by phase')
+    parser.add_argument('--batch', action='store_true', help='send each frame to Tcl through a CanvasBatch')
+    parser.add_argument('--no-cull', action='store_true', help='make the camera see the whole world')
+    args = parser.parse_args()
+    if args.memory:
+        print_memory_footprint()
+        print()
+    print_frame_benchmarks(args.frames, not args.immediate, args.scenario, args.profile, args.batch,
+                           not args.no_cull)
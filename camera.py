@@ -0,0 +1,118 @@
+from spritelib_v4 import *
+
+
+class Camera:
+    # The part of the world the canvas shows. Sprites keep world coordinates,
+    # apply scrolls the canvas there and sees tells whether a sprite is in view.
+    def __init__(self, width: int, height: int, world_width: int = None, world_height: int = None) -> None:
+        super().__init__()
+        self.width = width
+        self.height = height
+        self._x = 0
+        self._y = 0
+        self._applied = None
+        self.resize_world(width if world_width is None else world_width,
+                          height if world_height is None else world_height)
+
+    @property
+    def x(self):
+        return self._x
+
+    @property
+    def y(self):
+        return self._y
+
+    @property
+    def view(self):
+        return self._x, self._y, self._x + self.width, self._y + self.height
+
+    def resize_world(self, world_width: int, world_height: int):
+        # Never smaller than the view, a small maze just sits in the top left corner
+        self.world_width = max(world_width, self.width)
+        self.world_height = max(world_height, self.height)
+        self.move_to(self._x, self._y)
+
+    def move_to(self, x: int, y: int):
+        self._x = max(0, min(x, self.world_width - self.width))
+        self._y = max(0, min(y, self.world_height - self.height))
+
+    def follow(self, sprite: Sprite):
+        self.move_to(sprite.x + sprite.width // 2 - self.width // 2,
+                     sprite.y + sprite.height // 2 - self.height // 2)
+
+    def sees(self, sprite: Sprite):
+        return sprite.x <= self._x + self.width and sprite.right >= self._x \
+               and sprite.y <= self._y + self.height and sprite.bottom >= self._y
+
+    def apply(self, canvas):
+        # Scrolls the canvas to the camera, only when either has changed since the last call
+        placed = (self._x, self._y, self.world_width, self.world_height)
+        if placed == self._applied:
+            return False
+        if self._applied is None or self._applied[2:] != placed[2:]:
+            canvas.configure(scrollregion=(0, 0, self.world_width, self.world_height))
+        canvas.xview_moveto(self._x / self.world_width)
+        canvas.yview_moveto(self._y / self.world_height)
+        self._applied = placed
+        return True
+
+    def __str__(self) -> str:
+        return "view: {}, world: {}x{}".format(self.view, self.world_width, self.world_height)
+
+
+class SpriteGrid:
+    # Things that do not move, bucketed by the chunk their top left corner is
+    # in, so finding what is inside a rectangle only looks at the chunks it
+    # covers. Anything with a sprite goes in, a plain Sprite is its own.
+    # The tag is put on the canvas items of everything in it when rendered.
+    def __init__(self, chunk_size: int = 128, tag: str = 'scenery') -> None:
+        super().__init__()
+        self.chunk_size = chunk_size
+        self.tag = tag
+        self._chunks = {}
+        self._count = 0
+        # Goes up with every change, so a cached query can tell it is stale
+        self.version = 0
+        # The largest width or height added, a query reaches back that far for
+        # things starting in a chunk to the left of or above the rectangle
+        self._reach = 0
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for items in self._chunks.values():
+            yield from items
+
+    def add(self, item):
+        sprite = item.sprite
+        key = (sprite.y // self.chunk_size, sprite.x // self.chunk_size)
+        self._chunks.setdefault(key, []).append(item)
+        self._reach = max(self._reach, sprite.width, sprite.height)
+        self._count += 1
+        self.version += 1
+
+    def extend(self, items):
+        for item in items:
+            self.add(item)
+
+    def clear(self):
+        self._chunks.clear()
+        self._count = 0
+        self._reach = 0
+        self.version += 1
+
+    def query(self, box):
+        left, top, right, bottom = box
+        size = self.chunk_size
+        chunks = self._chunks
+        found = []
+        for row in range((top - self._reach) // size, bottom // size + 1):
+            for col in range((left - self._reach) // size, right // size + 1):
+                items = chunks.get((row, col))
+                if items is not None:
+                    for item in items:
+                        sprite = item.sprite
+                        if sprite.x <= right and sprite.right >= left and sprite.y <= bottom and sprite.bottom >= top:
+                            found.append(item)
+        return found
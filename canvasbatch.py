@@ -0,0 +1,109 @@
+# Runs a list of canvas subcommands, each one a Tcl list like {coords 12 3 3 19 19}
+RUN_PROC = 'proc ::canvasbatch_run {canvas ops} {foreach op $ops {$canvas {*}$op}}'
+
+
+def _options(kwargs: dict):
+    # The same option words tkinter would build, None meaning "leave it out"
+    words = ()
+    for key, value in kwargs.items():
+        if value is not None:
+            words += ('-' + key.rstrip('_'), value)
+    return words
+
+
+def _flatten(args: tuple):
+    words = ()
+    for arg in args:
+        words += tuple(arg) if isinstance(arg, (list, tuple)) else (arg,)
+    return words
+
+
+class CanvasBatch:
+    # Stands in for a Canvas and queues the calls sprites make every frame,
+    # coords, itemconfig, move and delete, then hands the whole frame to Tcl
+    # in one call from flush. Anything else goes straight to the canvas after
+    # flushing, so queries always see the queued changes.
+    # Creating returns an item id the caller may keep, so creates are only
+    # queued with defer_creates=True, for immediate mode drawing that ignores the ids.
+    def __init__(self, canvas, defer_creates: bool = False) -> None:
+        super().__init__()
+        self.canvas = canvas
+        self.defer_creates = defer_creates
+        self._ops = []
+        # Tcl calls saved in the last finished frame, in the current one and overall
+        self.saved = 0
+        self.frame_saved = 0
+        self.total_saved = 0
+        self.flushes = 0
+        canvas.tk.eval(RUN_PROC)
+
+    def __len__(self):
+        return len(self._ops)
+
+    def _create(self, kind: str, args: tuple, kwargs: dict):
+        if not self.defer_creates:
+            self.flush()
+            return getattr(self.canvas, 'create_' + kind)(*args, **kwargs)
+        self._ops.append(('create', kind) + _flatten(args) + _options(kwargs))
+        return None
+
+    def create_rectangle(self, *args, **kwargs):
+        return self._create('rectangle', args, kwargs)
+
+    def create_image(self, *args, **kwargs):
+        return self._create('image', args, kwargs)
+
+    def create_text(self, *args, **kwargs):
+        return self._create('text', args, kwargs)
+
+    def create_oval(self, *args, **kwargs):
+        return self._create('oval', args, kwargs)
+
+    def create_line(self, *args, **kwargs):
+        return self._create('line', args, kwargs)
+
+    def coords(self, item, *args):
+        if not args:
+            self.flush()
+            return self.canvas.coords(item)
+        self._ops.append(('coords', item) + _flatten(args))
+
+    def itemconfig(self, item, cnf=None, **kwargs):
+        if cnf is not None or not kwargs:
+            self.flush()
+            return self.canvas.itemconfig(item, cnf, **kwargs)
+        self._ops.append(('itemconfigure', item) + _options(kwargs))
+
+    itemconfigure = itemconfig
+
+    def move(self, item, x_amount, y_amount):
+        self._ops.append(('move', item, x_amount, y_amount))
+
+    def delete(self, *items):
+        if items:
+            self._ops.append(('delete',) + items)
+
+    def flush(self):
+        ops = self._ops
+        if not ops:
+            return 0
+        self._ops = []
+        self.canvas.tk.call('::canvasbatch_run', self.canvas._w, tuple(ops))
+        # One call instead of one per queued operation
+        saved = len(ops) - 1
+        self.frame_saved += saved
+        self.total_saved += saved
+        self.flushes += 1
+        return saved
+
+    def end_frame(self):
+        self.flush()
+        self.saved = self.frame_saved
+        self.frame_saved = 0
+        return self.saved
+
+    def __getattr__(self, name):
+        if name in ('canvas', '_ops'):
+            raise AttributeError(name)
+        self.flush()
+        return getattr(self.canvas, name)
@@ -0,0 +1,164 @@
+from spritelib_v4 import *
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DIRECTIONS = [Direction.STOPPED, Direction.LEFT, Direction.RIGHT, Direction.UP, Direction.DOWN]
+DIRECTION_CODES = {direction: code for code, direction in enumerate(DIRECTIONS)}
+
+
+class EntityStore:
+    def __init__(self, capacity: int = 64, seed: int = None) -> None:
+        super().__init__()
+        if np is None:
+            raise ImportError('EntityStore needs numpy, install it with "pip install numpy"')
+        self._count = 0
+        self._capacity = 0
+        self._entities = []
+        self.rng = np.random.default_rng(seed)
+        self._step_x = np.array([0, -1, 1, 0, 0])
+        self._step_y = np.array([0, 0, 0, -1, 1])
+        self._fields = {}
+        for name in ('x', 'y', 'width', 'height', 'speed', 'delay_time', 'elapsed_time',
+                     'left_limit', 'right_limit', 'top_limit', 'bottom_limit'):
+            self._fields[name] = np.zeros(0, dtype=np.int64)
+        self._fields['direction'] = np.zeros(0, dtype=np.int8)
+        self._grow(capacity)
+
+    def _grow(self, capacity: int):
+        for name, array in self._fields.items():
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:self._count] = array[:self._count]
+            self._fields[name] = grown
+        self._capacity = capacity
+
+    def __len__(self):
+        return self._count
+
+    def __getattr__(self, name):
+        # Expose each column as a view trimmed to the live entities, e.g. store.x
+        fields = self.__dict__.get('_fields')
+        if fields is None or name not in fields:
+            raise AttributeError(name)
+        return fields[name][:self._count]
+
+    @property
+    def entities(self):
+        return self._entities
+
+    def add(self, x: int, y: int, width: int, height: int,
+            direction: Direction = Direction.RIGHT, delay_time: int = 100, speed: int = 1,
+            left_limit: int = 0, right_limit: int = 800,
+            top_limit: int = 0, bottom_limit: int = 600):
+        if self._count == self._capacity:
+            self._grow(self._capacity * 2)
+        index = self._count
+        values = {'x': x, 'y': y, 'width': width, 'height': height,
+                  'direction': DIRECTION_CODES[direction], 'delay_time': delay_time, 'speed': abs(speed),
+                  'elapsed_time': 0, 'left_limit': left_limit, 'right_limit': right_limit,
+                  'top_limit': top_limit, 'bottom_limit': bottom_limit}
+        for name, value in values.items():
+            self._fields[name][index] = value
+        self._entities.append(None)
+        self._count += 1
+        return index
+
+    def add_entity(self, entity):
+        # entity is anything with sprite, mover and clamp, e.g. MovingSprite or Monster
+        sprite = entity.sprite
+        mover = entity.mover
+        index = self.add(sprite.x, sprite.y, sprite.width, sprite.height,
+                         mover.direction, mover.delay_time, mover.speed,
+                         entity.clamp.left_limit, entity.clamp.right_limit,
+                         entity.clamp.top_limit, entity.clamp.bottom_limit)
+        self._fields['elapsed_time'][index] = mover.elapsed_time
+        self._entities[index] = entity
+        return index
+
+    def pull(self):
+        # Copy sprite and mover state into the arrays, after outside code has changed it
+        for index, entity in enumerate(self._entities):
+            if entity is not None:
+                self._fields['x'][index] = entity.sprite.x
+                self._fields['y'][index] = entity.sprite.y
+                self._fields['direction'][index] = DIRECTION_CODES[entity.mover.direction]
+
+    def push(self):
+        xs = self.x.tolist()
+        ys = self.y.tolist()
+        directions = self.direction.tolist()
+        elapsed = self.elapsed_time.tolist()
+        for index, entity in enumerate(self._entities):
+            if entity is not None:
+                sprite = entity.sprite
+                if sprite.x != xs[index]:
+                    sprite.x = xs[index]
+                if sprite.y != ys[index]:
+                    sprite.y = ys[index]
+                entity.mover.direction = DIRECTIONS[directions[index]]
+                entity.mover.elapsed_time = elapsed[index]
+
+    def update(self, delta_time: int):
+        # Mover.update for every entity at once
+        elapsed = self.elapsed_time
+        delay = self.delay_time
+        elapsed += delta_time
+        due = elapsed >= delay
+        elapsed[due] -= delay[due]
+        elapsed[due & (elapsed >= delay)] = 0
+        self._move(due, 1)
+        return due
+
+    def backup(self, mask):
+        self._move(mask, -1)
+
+    def _move(self, mask, sign: int):
+        direction = self.direction
+        distance = self.speed * mask * sign
+        self.x[:] += self._step_x[direction] * distance
+        self.y[:] += self._step_y[direction] * distance
+
+    def clamp_all(self):
+        # Clamp.clamp_all for every entity at once
+        x = self.x
+        y = self.y
+        x[:] = np.where(x < self.left_limit, self.left_limit,
+                        np.where(x + self.width > self.right_limit, self.right_limit - self.width, x))
+        y[:] = np.where(y < self.top_limit, self.top_limit,
+                        np.where(y + self.height > self.bottom_limit, self.bottom_limit - self.height, y))
+
+    def intersecting(self, box):
+        # Same inclusive edges as Sprite.intersects, returns the matching indices
+        x = self.x
+        y = self.y
+        hit = ~((x + self.width < box[0]) | (x > box[2]) | (y + self.height < box[1]) | (y > box[3]))
+        return np.flatnonzero(hit)
+
+    def wall_hits(self, walls, layout: CellLayout):
+        # walls is a 2D bool array over the maze cells. Movers are never bigger
+        # than a cell, so checking the cells under the four corners covers them.
+        rows, columns = walls.shape
+        left = self.x
+        top = self.y
+        first_col = (left - layout.offset_x - 1) // layout.cell_size
+        last_col = (left + self.width - layout.offset_x) // layout.cell_size
+        first_row = (top - layout.offset_y - 1) // layout.cell_size
+        last_row = (top + self.height - layout.offset_y) // layout.cell_size
+        hit = np.zeros(self._count, dtype=bool)
+        for row in (first_row, last_row):
+            for col in (first_col, last_col):
+                inside = (row >= 0) & (row < rows) & (col >= 0) & (col < columns)
+                hit[inside] |= walls[row[inside], col[inside]]
+        return hit
+
+    def random_directions(self, mask):
+        # Monster.random_direction for every masked entity at once
+        indices = np.flatnonzero(mask)
+        choice = self.rng.integers(1, 5, size=len(indices))
+        current = self.direction[indices]
+        reverse = np.array([0, 2, 1, 4, 3])
+        wanted = np.array([0, 1, 2, 3, 4])[choice]
+        allowed = current != reverse[wanted]
+        self.direction[indices[allowed]] = wanted[allowed]
@@ -0,0 +1,92 @@
+from collections import deque
+from time import perf_counter
+
+PROFILE_ENV = 'PACMAN_PROFILE'
+
+
+class RollingStats:
+    def __init__(self, window: int = 240) -> None:
+        super().__init__()
+        self._samples = deque(maxlen=window)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, value: float):
+        self._samples.append(value)
+
+    def percentile(self, percent: float):
+        # Nearest rank over the last window samples
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    @property
+    def mean(self):
+        return sum(self._samples) / len(self._samples) if self._samples else 0.0
+
+    def clear(self):
+        self._samples.clear()
+
+
+class FrameProfiler:
+    # Times the phases of each frame. Time spent in a phase is summed over the
+    # frame, a phase run once per fixed step counts all its steps, and each
+    # frame's totals go into rolling windows for the percentiles.
+    def __init__(self, window: int = 240) -> None:
+        super().__init__()
+        self.window = window
+        self.stats = {}
+        self.frame_stats = RollingStats(window)
+        self._current = {}
+        self._frame_start = None
+        self._frame_end = None
+        self.frames = 0
+
+    def begin_frame(self):
+        now = perf_counter()
+        if self._frame_end is not None:
+            # Whatever happened between frames: after() waiting and other Tk events
+            self._current['idle'] = now - self._frame_end
+        self._frame_start = now
+        return now
+
+    def lap(self, phase: str, start: float):
+        # Adds the time since start to phase and returns now, so the next phase can start from it
+        now = perf_counter()
+        self._current[phase] = self._current.get(phase, 0.0) + now - start
+        return now
+
+    def end_frame(self):
+        now = perf_counter()
+        if self._frame_start is not None:
+            self.frame_stats.add((now - self._frame_start) * 1000)
+        for phase in self.stats:
+            if phase not in self._current:
+                self.stats[phase].add(0.0)
+        for phase, seconds in self._current.items():
+            stats = self.stats.get(phase)
+            if stats is None:
+                stats = self.stats[phase] = RollingStats(self.window)
+            stats.add(seconds * 1000)
+        self._current.clear()
+        self._frame_end = now
+        self.frames += 1
+
+    def reset(self):
+        # Forget the gap after a pause or suspend so it does not show up as idle time
+        self._frame_start = None
+        self._frame_end = None
+        self._current.clear()
+
+    def report(self):
+        lines = [f'{"phase":<12}{"p50":>7}{"p95":>7}{"p99":>7} ms']
+        for phase, stats in list(self.stats.items()) + [('frame', self.frame_stats)]:
+            lines.append(f'{phase:<12}{stats.percentile(50):>7.2f}{stats.percentile(95):>7.2f}'
+                         f'{stats.percentile(99):>7.2f}')
+        return '\n'.join(lines)
+
+    def __str__(self) -> str:
+        return self.report()
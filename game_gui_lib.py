@@ -1,8 +1,19 @@
 from __future__ import annotations
 
-from time import time_ns
+import os
+from time import time_ns, perf_counter
+from tkinter import *
 
 from pacman_lib import *
+from imagehelper import *
+from spriteatlas import *
+from nonblockingdelay import *
+from gameclock import *
+from soundbank import *
+from frameprofiler import *
+from recorder import *
+from canvasbatch import *
+from camera import *
 
 
 class MyApp(Tk):
@@ -11,184 +22,407 @@ class MyApp(Tk):
                  useTk=True, sync=False, use=None) -> None:
         super().__init__(screenName, baseName, className, useTk, sync, use)
         self.geometry("800x600")
-        container = Frame(self)
-        container.pack(fill="both", expand=True, side="top")
-        container.grid_rowconfigure(0, weight=1)
-        container.grid_columnconfigure(0, weight=1)
-        splash = SplashScreen(container, self)
-        splash.grid(row=0, column=0, sticky="news")
-        instructions = InstructionScreen(container, self)
-        instructions.grid(row=0, column=0, sticky="news")
-        playgame = PacmanGameScreen(container, self)
-        playgame.grid(row=0, column=0, sticky="news")
-        gameover = GameOverScreen(container, self)
-        gameover.grid(row=0, column=0, sticky="news")
-        menu_screen = MenuScreen(container, self)
-        menu_screen.grid(row=0, column=0, sticky="news")
-        self.frames = {
-            "splash": splash,
-            "playgame": playgame,
-            "instructions": instructions,
-            "gameover": gameover,
-            'menu': menu_screen
+        # Delayed calls run on the Tk event loop, not on a thread each
+        self.scheduler = Scheduler(self).install()
+        # Pre-scaled pixels from "python spriteatlas.py", when it has been built
+        ImageHelper.use_atlas(SpriteAtlas.load())
+        # Effects are decoded here once, playing them later is only a mixer call
+        self.sounds = SoundBank().load_all()
+        self.container = Frame(self)
+        self.container.pack(fill="both", expand=True, side="top")
+        self.container.grid_rowconfigure(0, weight=1)
+        self.container.grid_columnconfigure(0, weight=1)
+        # Screens are only built the first time they are shown
+        self.screens = {
+            "splash": SplashScreen,
+            "playgame": PacmanGameScreen,
+            "instructions": InstructionScreen,
+            "gameover": GameOverScreen,
+            'menu': MenuScreen
         }
+        self.frames = {}
+        self.current_frame = None
         self.show_frame("splash")
 
+    def get_frame(self, frame_name: str):
+        frame = self.frames.get(frame_name)
+        if frame is None:
+            frame = self.screens[frame_name](self.container, self)
+            frame.grid(row=0, column=0, sticky="news")
+            self.frames[frame_name] = frame
+        return frame
+
     def show_frame(self, frame_name: str):
-        frame = self.frames[frame_name]
+        frame = self.get_frame(frame_name)
+        if self.current_frame is not frame and isinstance(self.current_frame, AnimatedGameFrame):
+            self.current_frame.suspend()
         frame.tkraise()  # Puts frame on top
+        if isinstance(frame, AnimatedGameFrame):
+            frame.resume()
+        self.current_frame = frame
 
 
 class AnimatedGameFrame(Frame):
     def __init__(
             self, master=None, delay_time: int = 8, canvas_width: int = 800, canvas_height: int = 600,
-            canvas_bg: str = 'white', paused: bool = False):
+            canvas_bg: str = 'white', paused: bool = False, retained: bool = False,
+            fixed_step: int = None, max_steps: int = 5, profile: bool = False, batch: bool = False,
+            canvas_factory=Canvas):
         super().__init__(master)
         self.delay_time = delay_time
         self.drawables = []
         self.updateables = []
         self.current_time = time_ns() // 1_000_000
         self.delta_time = 0
-        self.canvas = Canvas(self, width=canvas_width, height=canvas_height, bg=canvas_bg)
+        # Called like Canvas, anything else that draws the same way can stand in for it
+        self.canvas = canvas_factory(self, width=canvas_width, height=canvas_height, bg=canvas_bg)
         self.canvas.pack()
+        # With batch=True every canvas call goes through a CanvasBatch and a
+        # frame's drawing reaches Tcl as one call when draw flushes it
+        self.batch = batch
+        if batch:
+            self.canvas = CanvasBatch(self.canvas, defer_creates=not retained)
         self._paused = paused
         self.canvas_width = canvas_width
         self.canvas_height = canvas_height
+        self.retained = retained
+        self.clock = FixedStepClock(fixed_step, max_steps) if fixed_step else None
+        self._suspended = False
+        self._after_id = None
+        # Key events are queued by bind_input and handled at the start of the next frame
+        self.input_queue = []
+        self.profiler = FrameProfiler() if profile else None
+        self.show_profile = False
+        self.profile_every = 30
+        # Things that never move, each SpriteGrid a layer drawn under the drawables, first one lowest
+        self.layers = []
+        # With a camera only what it sees is drawn, everything else is taken off the canvas
+        self.camera = None
+        self._layer_items = []
+        self._layers_seen = None
+        self._shown_layers = set()
+        self._shown_drawables = set()
 
     def start(self):
         if self._paused:
             self._paused = False
-            self.animate()
+            self.restart_loop()
 
     def stop(self):
         self._paused = True
 
+    def suspend(self):
+        # Hidden screens stop their loop without changing the paused state
+        self._suspended = True
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+            self._after_id = None
+
+    def resume(self):
+        if self._suspended:
+            self._suspended = False
+            if not self._paused:
+                self.restart_loop()
+
+    def restart_loop(self):
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+        self.current_time = time_ns() // 1_000_000
+        self.input_queue = []
+        if self.clock is not None:
+            self.clock.reset()
+        if self.profiler is not None:
+            self.profiler.reset()
+        self.animate()
+
+    @property
+    def is_suspended(self):
+        return self._suspended
+
     @property
     def is_paused(self):
         return self._paused
 
-    def update(self):
+    @property
+    def alpha(self):
+        return self.clock.alpha if self.clock is not None else 1.0
+
+    def bind_input(self, sequence: str, handler):
+        self.winfo_toplevel().bind(sequence, lambda evt: self.queue_input(handler, evt))
+
+    def queue_input(self, handler, evt):
+        # Only animate empties the queue, so keys pressed while it is not running are dropped
+        if not self._paused and not self._suspended:
+            self.input_queue.append((handler, evt))
+
+    def handle_input(self):
+        queue = self.input_queue
+        self.input_queue = []
+        for handler, evt in queue:
+            handler(evt)
+
+    def toggle_profile(self, evt=None):
+        self.show_profile = not self.show_profile
+        if not self.show_profile:
+            self.canvas.delete("profile")
+
+    def view_origin(self):
+        # Where the top left corner of the canvas is in the world
+        return (self.camera.x, self.camera.y) if self.camera is not None else (0, 0)
+
+    def draw_profile(self):
+        # Refreshed every profile_every frames, the percentiles do not change faster than that
+        x, y = self.view_origin()
+        if not self.canvas.find_withtag("profile"):
+            self.canvas.create_text(x + 4, y + 4, anchor=NW, fill="yellow", font="Courier 9", tags="profile")
+        else:
+            if self.camera is not None:
+                self.canvas.coords("profile", x + 4, y + 4)
+            if self.profiler.frames % self.profile_every:
+                return
+        text = self.profiler.report()
+        if self.batch:
+            text += f'\ntcl calls saved {self.canvas.saved}'
+        self.canvas.itemconfig("profile", text=text)
+        self.canvas.tag_raise("profile")
+
+    def tick(self):
         last_time = self.current_time
         self.current_time = time_ns() // 1_000_000
-        self.delta_time = self.current_time - last_time
+        frame_time = self.current_time - last_time
+        if self.clock is None:
+            self.delta_time = frame_time
+            self.update()
+        else:
+            # Simulate in whole fixed steps so game speed does not depend on
+            # how late after() fires, leaving the remainder for next frame
+            self.delta_time = self.clock.step
+            for _ in range(self.clock.advance(frame_time)):
+                self.update()
+                if self._paused:
+                    break
+
+    def update(self):
+        profiler = self.profiler
+        start = perf_counter() if profiler is not None else 0
         for u in self.updateables:
             u.update(self.delta_time)
+        if profiler is not None:
+            profiler.lap('updateables', start)
+
+    def cull(self):
+        # Works out what to draw and erases whatever went out of view, so the
+        # canvas never holds much more than a screenful of items however big the
+        # world is. Layers are only looked at again when the camera has moved or
+        # a layer has changed. True when something new came into view.
+        canvas = self.canvas
+        camera = self.camera
+        appeared = False
+        seen = (camera.view if camera is not None else None, [layer.version for layer in self.layers])
+        if seen != self._layers_seen:
+            self._layers_seen = seen
+            if camera is None:
+                self._layer_items = [list(layer) for layer in self.layers]
+            else:
+                self._layer_items = [layer.query(camera.view) for layer in self.layers]
+            shown = set()
+            for items in self._layer_items:
+                shown.update(items)
+            for item in self._shown_layers - shown:
+                item.erase(canvas)
+            appeared = not shown <= self._shown_layers
+            self._shown_layers = shown
+        if camera is None:
+            return self._layer_items, self.drawables, appeared
+        sees = camera.sees
+        drawables = [d for d in self.drawables if sees(d.sprite)]
+        shown = set(drawables)
+        if shown != self._shown_drawables:
+            for d in self._shown_drawables - shown:
+                d.erase(canvas)
+            appeared = appeared or not shown <= self._shown_drawables
+            self._shown_drawables = shown
+        return self._layer_items, drawables, appeared
 
     def draw(self):
-        self.canvas.delete('all')
-        for d in self.drawables:
-            d.draw(self.canvas)
+        canvas = self.canvas
+        if self.camera is not None:
+            self.camera.apply(canvas)
+        layers, drawables, appeared = self.cull()
+        if self.retained:
+            for layer, items in zip(self.layers, layers):
+                for item in items:
+                    item.render(canvas, layer.tag)
+            for d in drawables:
+                d.render(canvas)
+            if appeared:
+                # New items are created on top, put the layers back under everything
+                for layer in reversed(self.layers):
+                    canvas.tag_lower(layer.tag)
+        else:
+            canvas.delete('all')
+            for items in layers:
+                for item in items:
+                    item.draw(canvas)
+            for d in drawables:
+                d.draw(canvas)
 
     def animate(self):
-        root = self.winfo_toplevel()
-        if not self._paused:
-            self.update()
-            self.draw()
-            root.after(self.delay_time, self.animate)
+        self._after_id = None
+        if not self._paused and not self._suspended:
+            profiler = self.profiler
+            if profiler is None:
+                self.handle_input()
+                self.tick()
+                self.draw()
+                if self.batch:
+                    self.canvas.end_frame()
+            else:
+                start = profiler.begin_frame()
+                self.handle_input()
+                profiler.lap('input', start)
+                self.tick()
+                start = perf_counter()
+                self.draw()
+                if self.show_profile:
+                    self.draw_profile()
+                if self.batch:
+                    self.canvas.end_frame()
+                profiler.lap('draw', start)
+                profiler.end_frame()
+            self._after_id = self.after(self.delay_time, self.animate)
+
+
+STATIC_CHUNK_SIZE = 256
+
+
+class BakedChunk:
+    # A piece of the static layer, composited from the parts under it when it
+    # is first drawn and dropped again when it is erased
+    def __init__(self, x: int, y: int, width: int, height: int, parts: SpriteGrid) -> None:
+        super().__init__()
+        self.parts = parts
+        self._sprite = Sprite(x, y, width, height, border_width=0)
+
+    @property
+    def sprite(self):
+        return self._sprite
+
+    def bake(self):
+        sprite = self._sprite
+        if sprite.image is None:
+            sprite.image = ImageHelper.composite(self.parts.query(sprite.bbox()), sprite.width, sprite.height,
+                                                 origin=(sprite.x, sprite.y))
+
+    def draw(self, canvas):
+        self.bake()
+        self._sprite.draw(canvas)
+
+    def render(self, canvas, tags: str = None):
+        self.bake()
+        self._sprite.render(canvas, tags)
+
+    def erase(self, canvas):
+        # A big maze has far more chunks than fit in memory as images
+        sprite = self._sprite
+        sprite.erase(canvas)
+        if sprite.image is not None:
+            self._sprite = Sprite(sprite.x, sprite.y, sprite.width, sprite.height, border_width=0)
 
 
 class PacmanGameScreen(AnimatedGameFrame):
     def __init__(self, master=None, controller: MyApp = None, delay_time: int = 8,
                  canvas_width: int = 452,
                  canvas_height: int = 500, canvas_bg: str = 'white',
-                 paused: bool = False):
+                 paused: bool = False, grid_collisions: bool = True, retained: bool = True,
+                 fixed_step: int = 8, seed: int = None, chase: bool = False, profile: bool = None,
+                 record: bool = None, batch: bool = True, level: str = CLASSIC_LEVEL,
+                 engine: PacmanEngine = None, canvas_factory=Canvas):
+        # With profile=True, or PACMAN_PROFILE=1 in the environment, each frame
+        # is timed by phase and F3 shows the overlay
+        if profile is None:
+            profile = os.environ.get(PROFILE_ENV, '') not in ('', '0')
         super().__init__(master, delay_time, canvas_width,
-                         canvas_height, canvas_bg, paused)
+                         canvas_height, canvas_bg, paused, retained, fixed_step, profile=profile, batch=batch,
+                         canvas_factory=canvas_factory)
         self.controller = controller
+        self.sounds = controller.sounds
+        if engine is None:
+            # The maze comes from a level file, compiled once and cached next to it
+            self.level = Level.load(level) if level is not None and os.path.isfile(level) else None
+            engine = PacmanEngine(seed=seed, grid_collisions=grid_collisions, chase=chase, level=self.level)
+        else:
+            self.level = engine.level
+        self.engine = engine
+        self.engine.profiler = self.profiler
+        # With record=True, or PACMAN_RECORD=1 in the environment, each game is
+        # saved under recordings/ when it ends, replay with recorder.py
+        if record is None:
+            record = os.environ.get(RECORD_ENV, '') not in ('', '0')
+        self.recorder = Recorder().attach(self.engine) if record else None
         self.load_assets()
         self.drawables = []
         self.updateables = []
-        self.entities = []
-        self.pills = []
-        self.number_of_pills = 300
-        self.blanks = []
-        self.walls = []
-        self.fruits = []
         self.game_over = False
 
         self.bg = Sprite(0, 0, canvas_width, canvas_height - 200, fill_color='#222222', image=self.bg_image)
-        self.drawables.append(self.bg)
-
-        self.pacman = AnimatedMovingSprite(self.pacman_images["Right"], 22, 22, direction=Direction.STOPPED,
-                                           border_color="green")
-        self.drawables.append(self.pacman)
-        self.updateables.append(self.pacman)
-        self.entities.append(self.pacman)
-
-        self.red_monster = Monster([self.redghost_image], 222, 220, direction=Direction.UP,
-                                   border_color="red")
-        self.drawables.append(self.red_monster)
-        self.updateables.append(self.red_monster)
-        self.entities.append(self.red_monster)
-
-        self.green_monster = Monster([self.greenghost_image], 222, 240, direction=Direction.UP,
-                                     border_color="green")
-        self.drawables.append(self.green_monster)
-        self.updateables.append(self.green_monster)
-        self.entities.append(self.green_monster)
-
-        self.yellow_monster = Monster([self.yellowghost_image], 222, 220, direction=Direction.UP,
-                                      border_color="yellow")
-        self.drawables.append(self.yellow_monster)
-        self.updateables.append(self.yellow_monster)
-        self.entities.append(self.yellow_monster)
-
-        self.pink_monster = Monster([self.pinkghost_image], 222, 240, direction=Direction.UP,
-                                    border_color="pink")
-        self.drawables.append(self.pink_monster)
-        self.updateables.append(self.pink_monster)
-        self.entities.append(self.pink_monster)
-
-        ####Generating Map####
-        i = 3
-        k = 3
-        for row in range(0, len(self.pacman_grid)):
-            for col in range(0, len(self.pacman_grid[0])):
-                if self.pacman_grid[row][col] == "pill":
-                    s = Sprite(i + 5, k + 5, fill_color="white", border_width=1, width=4, height=4)
-                    self.pills.append(s)
-                elif self.pacman_grid[row][col] == "wall":
-                    s = Sprite(i, k, border_color="red", border_width=0, width=16, height=16)
-                    self.walls.append(s)
-                elif self.pacman_grid[row][col] == "blank":
-                    s = Sprite(i, k, border_color="red", border_width=0, width=16, height=16)
-                    self.blanks.append(s)
-                else:
-                    s = Sprite(i, k, border_color="red", border_width=1, width=16, height=16)
-                    self.fruits.append(s)
-                self.drawables.append(s)
-                i += 16
-            k += 16
-            i = 3
-        #####################
+        # The maze can be bigger than the canvas, the camera keeps Pac-Man in the middle of it
+        self.camera = Camera(canvas_width, canvas_height)
+        self.static_layer = SpriteGrid(STATIC_CHUNK_SIZE, 'static')
+        self.tiles = SpriteGrid(tag='tiles')
+        self.layers = [self.static_layer, self.tiles]
+
+        self.pacman = self.engine.pacman
+        self.pacman_animation = self.add_animation(self.pacman, self.pacman_images["Right"])
+
+        self.red_monster = self.engine.red_monster
+        self.green_monster = self.engine.green_monster
+        self.yellow_monster = self.engine.yellow_monster
+        self.pink_monster = self.engine.pink_monster
+        # A level can have any number of ghosts, each looks like its colour
+        for monster in self.engine.monsters:
+            self.add_animation(monster, [self.ghost_images.get(monster.sprite.border_color, self.redghost_image)])
+
+        self.show_map()
 
         self.bind_keys()
+        self.sounds.play_music()
         self.draw()
         self.animate()
         self.update()
 
+    def add_animation(self, entity, images: list):
+        # The engine only moves plain sprites, the pictures are this screen's business
+        entity.sprite.image = images[0]
+        animation = Animation(entity.sprite, images)
+        self.drawables.append(entity)
+        self.updateables.append(animation)
+        return animation
+
     def bind_keys(self):
         self.root = self.winfo_toplevel()
-        self.root.bind('<Left>', self.pacman_left)
-        self.root.bind('<Right>', self.pacman_right)
-        self.root.bind('<Up>', self.pacman_up)
-        self.root.bind('<Down>', self.pacman_down)
+        self.bind_input('<Left>', self.pacman_left)
+        self.bind_input('<Right>', self.pacman_right)
+        self.bind_input('<Up>', self.pacman_up)
+        self.bind_input('<Down>', self.pacman_down)
+        if self.profiler is not None:
+            self.root.bind('<F3>', self.toggle_profile)
 
     def pacman_right(self, evt):
-        self.pacman.mover.direction = Direction.RIGHT
-        self.pacman.animation.images = self.pacman_images["Right"]
+        self.engine.turn(Direction.RIGHT)
+        self.pacman_animation.images = self.pacman_images["Right"]
 
     def pacman_left(self, evt):
-        self.pacman.mover.direction = Direction.LEFT
-        self.pacman.animation.images = self.pacman_images["Left"]
+        self.engine.turn(Direction.LEFT)
+        self.pacman_animation.images = self.pacman_images["Left"]
 
     def pacman_up(self, evt):
-        self.pacman.mover.direction = Direction.UP
-        self.pacman.animation.images = self.pacman_images["Up"]
+        self.engine.turn(Direction.UP)
+        self.pacman_animation.images = self.pacman_images["Up"]
 
     def pacman_down(self, evt):
-        self.pacman.mover.direction = Direction.DOWN
-        self.pacman.animation.images = self.pacman_images["Down"]
+        self.engine.turn(Direction.DOWN)
+        self.pacman_animation.images = self.pacman_images["Down"]
 
     def load_assets(self):
         self.bg_image = ImageHelper.get_sized_image('images/Originalpacmaze.png', 452, 500)
@@ -202,6 +436,8 @@ class PacmanGameScreen(AnimatedGameFrame):
         self.yellowghost_image = ImageHelper.get_sized_image("images/yellowghost.png", 12, 12)
         self.greenghost_image = ImageHelper.get_sized_image("images/greenghost.png", 12, 12)
         self.pinkghost_image = ImageHelper.get_sized_image("images/pinkghost.png", 12, 12)
+        self.ghost_images = {"red": self.redghost_image, "green": self.greenghost_image,
+                             "yellow": self.yellowghost_image, "pink": self.pinkghost_image}
 
         self.pacman_images = dict({
             "Left": [closed_image, left_image],
@@ -209,44 +445,36 @@ class PacmanGameScreen(AnimatedGameFrame):
             "Up": [closed_image, up_image],
             "Down": [closed_image, down_image]})
 
-        W = "wall"
-        P = "pill"
-        B = "blank"
-        F = "fruit"
-
-        # 10                           #20
-        # 1  2  3  4  5  6  7  8  9  0  1  2  3  4  5  6  7  8  9  0  1  2  3  4  5  6  7  8
-        self.pacman_grid = [[W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W],  # 1
-                            [W, P, P, P, P, P, P, P, P, P, P, P, P, W, W, P, P, P, P, P, P, P, P, P, P, P, P, W],  # 2
-                            [W, P, W, W, W, W, P, W, W, W, W, W, P, W, W, P, W, W, W, W, W, P, W, W, W, W, P, W],  # 3
-                            [W, P, W, W, W, W, P, W, W, W, W, W, P, W, W, P, W, W, W, W, W, P, W, W, W, W, P, W],  # 4
-                            [W, P, W, W, W, W, P, W, W, W, W, W, P, W, W, P, W, W, W, W, W, P, W, W, W, W, P, W],  # 5
-                            [W, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, W],  # 6
-                            [W, P, W, W, W, W, P, W, W, P, W, W, W, W, W, W, W, W, P, W, W, P, W, W, W, W, P, W],  # 7
-                            [W, P, W, W, W, W, P, W, W, P, W, W, W, W, W, W, W, W, P, W, W, P, W, W, W, W, P, W],  # 8
-                            [W, P, P, P, P, P, P, W, W, P, P, P, P, W, W, P, P, P, P, W, W, P, P, P, P, P, P, W],  # 9
-                            [W, W, W, W, W, W, P, W, W, W, W, W, P, W, W, P, W, W, W, W, W, P, W, W, W, W, W, W],  # 10
-                            [W, W, W, W, W, W, P, W, W, W, W, W, P, W, W, P, W, W, W, W, W, P, W, W, W, W, W, W],  # 11
-                            [W, W, W, W, W, W, P, W, W, P, P, P, P, P, P, P, P, P, P, W, W, P, W, W, W, W, W, W],  # 12
-                            [W, W, W, W, W, W, P, W, W, P, W, W, W, B, B, W, W, W, P, W, W, P, W, W, W, W, W, W],  # 13
-                            [W, W, W, W, W, W, P, W, W, P, W, B, B, B, B, B, B, W, P, W, W, P, W, W, W, W, W, W],  # 14
-                            [P, P, P, P, P, P, P, P, P, P, W, B, B, B, B, B, B, W, P, P, P, P, P, P, P, P, P, P],  # 15
-                            [W, W, W, W, W, W, P, W, W, P, W, B, B, B, B, B, B, W, P, W, W, P, W, W, W, W, W, W],  # 16
-                            [W, W, W, W, W, W, P, W, W, P, W, W, W, W, W, W, W, W, P, W, W, P, W, W, W, W, W, W],  # 17
-                            [W, W, W, W, W, W, P, W, W, P, P, P, P, P, P, P, P, P, P, W, W, P, W, W, W, W, W, W],  # 18
-                            [W, W, W, W, W, W, P, W, W, P, W, W, W, W, W, W, W, W, P, W, W, P, W, W, W, W, W, W],  # 19
-                            [W, W, W, W, W, W, P, W, W, P, W, W, W, W, W, W, W, W, P, W, W, P, W, W, W, W, W, W],  # 20
-                            [W, P, P, P, P, P, P, P, P, P, P, P, P, W, W, P, P, P, P, P, P, P, P, P, P, P, P, W],  # 21
-                            [W, P, W, W, W, W, P, W, W, W, W, W, P, W, W, P, W, W, W, W, W, P, W, W, W, W, P, W],  # 22
-                            [W, P, W, W, W, W, P, W, W, W, W, W, P, W, W, P, W, W, W, W, W, P, W, W, W, W, P, W],  # 23
-                            [W, P, P, P, W, W, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, W, W, P, P, P, W],  # 24
-                            [W, W, W, P, W, W, P, W, W, P, W, W, W, W, W, W, W, W, P, W, W, P, W, W, P, W, W, W],  # 25
-                            [W, W, W, P, W, W, P, W, W, P, W, W, W, W, W, W, W, W, P, W, W, P, W, W, P, W, W, W],  # 26
-                            [W, P, P, P, P, P, P, W, W, P, P, P, P, W, W, P, P, P, P, W, W, P, P, P, P, P, P, W],  # 27
-                            [W, P, W, W, W, W, W, W, W, W, W, W, P, W, W, P, W, W, W, W, W, W, W, W, W, W, P, W],  # 28
-                            [W, P, W, W, W, W, W, W, W, W, W, W, P, W, W, P, W, W, W, W, W, W, W, W, W, W, P, W],  # 29
-                            [W, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, W],  # 30
-                            [W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W]]  # 31
+    def show_map(self):
+        for tile in self.tiles:
+            tile.erase(self.canvas)
+        self.tiles.clear()
+        self.tiles.extend(self.engine.pills.values())
+        self.tiles.extend(self.engine.fruits)
+        self.camera.resize_world(self.engine.world_width, self.engine.world_height)
+        self.bake_static_layer()
+
+    def bake_static_layer(self):
+        # Walls and blanks never change, so they are flattened onto the
+        # background instead of being drawn every frame. The world is cut
+        # into chunks that are only composited while the camera shows them.
+        for chunk in self.static_layer:
+            chunk.erase(self.canvas)
+        self.static_layer.clear()
+        self.bg.image = self.bg_image
+        size = self.static_layer.chunk_size
+        parts = SpriteGrid(size)
+        parts.extend(sprite for sprite in [self.bg] + self.engine.walls + self.engine.blanks
+                     if sprite.image is not None or sprite.fill_color or sprite.border_width > 0)
+        width = self.camera.world_width
+        height = self.camera.world_height
+        for y in range(0, height, size):
+            for x in range(0, width, size):
+                self.static_layer.add(BakedChunk(x, y, min(size, width - x), min(size, height - y), parts))
+
+    @property
+    def number_of_pills(self):
+        return self.engine.number_of_pills
 
     def quit(self, evt=None):
         self.root.quit()
@@ -254,78 +482,41 @@ class PacmanGameScreen(AnimatedGameFrame):
     def reset_game(self, evt=None):
         print('reset')
         self.load_assets()
-        self.number_of_pills = 300
-        i = 3
-        k = 3
-        for row in range(0, len(self.pacman_grid)):
-            for col in range(0, len(self.pacman_grid[0])):
-                if self.pacman_grid[row][col] == "pill":
-                    s = Sprite(i + 5, k + 5, fill_color="white", border_width=1, width=4, height=4)
-                    self.pills.append(s)
-                elif self.pacman_grid[row][col] == "wall":
-                    s = Sprite(i, k, border_color="red", border_width=0, width=16, height=16)
-                    self.walls.append(s)
-                elif self.pacman_grid[row][col] == "blank":
-                    s = Sprite(i, k, border_color="red", border_width=0, width=16, height=16)
-                    self.blanks.append(s)
-                else:
-                    s = Sprite(i, k, border_color="red", border_width=1, width=16, height=16)
-                    self.fruits.append(s)
-                self.drawables.append(s)
-                i += 16
-            k += 16
-            i = 3
-        self.pacman.sprite.x = 22
-        self.pacman.sprite.y = 22
-        self.red_monster.sprite.x = 222
-        self.red_monster.sprite.y = 220
-        self.green_monster.sprite.x = 222
-        self.green_monster.sprite.y = 240
-        self.yellow_monster.sprite.x = 222
-        self.yellow_monster.sprite.y = 240
-        self.pink_monster.sprite.x = 222
-        self.pink_monster.sprite.y = 240
+        self.engine.reset()
+        self.show_map()
 
     def update(self):
         super().update()
+        self.engine.step(self.delta_time)
+        for event in self.engine.events:
+            self.sounds.trigger(event.value)
 
-        if self.number_of_pills == 0:
+        if self.engine.state is not GameState.PLAYING:
             self.stop()
+            self.sounds.stop_music()
+            if self.recorder is not None:
+                self.recorder.finish(self.engine).save()
             self.controller.show_frame("gameover")
-            call_later(3, self.quit)
-
-        for wall in self.walls:
-            for index in range(0, len(self.entities)):
-                if self.entities[index].sprite.intersects(wall.bbox()):
-                    self.entities[index].mover.backup()
-                    if type(self.entities[index]) == Monster:
-                        self.entities[index].random_direction()
-
-        for pill in self.pills:
-            if self.pacman.sprite.intersects(pill.bbox()):
-                for row in range(0, len(self.pacman_grid)):
-                    for col in range(0, len(self.pacman_grid[0])):
-                        if self.pacman_grid[row][col] == pill:
-                            self.pacman_grid[row][col] = "blank"
-                self.pacman.sprite.draw(self.canvas)
-
-                pill.fill_color = ""
-                pill.border_width = 0
-                self.pills.remove(pill)
-                self.number_of_pills -= 1
-
-        for entity in self.entities:
-            if entity is not self.pacman:
-                if entity.sprite.intersects(self.pacman.sprite.bbox()):
-                    self.stop()
-                    self.controller.show_frame("gameover")
-                    call_later(3, self.quit)
+            self.controller.scheduler.call_later(3, self.quit, key="quit")
+
+    def suspend(self):
+        super().suspend()
+        self.sounds.stop_music()
 
+    def resume(self):
+        was_suspended = self.is_suspended
+        super().resume()
+        if was_suspended and not self.is_paused:
+            self.sounds.play_music()
 
     def draw(self):
+        self.camera.follow(self.pacman.sprite)
         super().draw()
-        if self.number_of_pills <= 0:
-            self.canvas.create_text(452 / 2, 500 / 2, text=f"Game Over", fill="red", font="Times 30 italic bold")
+        self.sounds.flush()
+        if self.number_of_pills <= 0 and not self.canvas.find_withtag("game_over"):
+            x, y = self.view_origin()
+            self.canvas.create_text(x + self.canvas_width / 2, y + self.canvas_height / 2, text=f"Game Over",
+                                    fill="red", font="Times 30 italic bold", tags="game_over")
 
 
 class SplashScreen(Frame):
@@ -340,7 +531,7 @@ class SplashScreen(Frame):
         self.bg_sprite = Sprite(0, 0, image=image)
         self.bg_sprite.draw(self.canvas)
 
-        call_later_with_param(3, controller.show_frame, 'menu')
+        controller.scheduler.call_later(3, controller.show_frame, 'menu', key="splash")
 
 
 class MenuScreen(Frame):
@@ -0,0 +1,45 @@
+class FixedStepClock:
+    def __init__(self, step: int = 8, max_steps: int = 5) -> None:
+        super().__init__()
+        self._step = step
+        self._max_steps = max_steps
+        self._accumulator = 0
+        self._dropped_time = 0
+
+    @property
+    def step(self):
+        return self._step
+
+    @property
+    def max_steps(self):
+        return self._max_steps
+
+    @max_steps.setter
+    def max_steps(self, value: int):
+        self._max_steps = value
+
+    @property
+    def alpha(self):
+        # How far the renderer is between the last simulated step and the next one
+        return self._accumulator / self._step
+
+    @property
+    def dropped_time(self):
+        return self._dropped_time
+
+    def advance(self, delta_time: int):
+        self._accumulator += delta_time
+        steps = min(self._accumulator // self._step, self._max_steps)
+        self._accumulator -= steps * self._step
+        if self._accumulator >= self._step:
+            # Too far behind to catch up, let the backlog go instead of
+            # spending every following frame simulating it
+            self._dropped_time += self._accumulator - self._accumulator % self._step
+            self._accumulator %= self._step
+        return steps
+
+    def reset(self):
+        self._accumulator = 0
+
+    def __str__(self) -> str:
+        return "step: {}, max steps: {}, accumulator: {}".format(self._step, self._max_steps, self._accumulator)
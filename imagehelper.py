@@ -1,9 +1,86 @@
 from tkinter import *
-from PIL import Image, ImageTk, ImageOps
+from PIL import Image, ImageTk, ImageDraw
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import os
 
+from spritelib_v4 import ImageHandle
+
+
+class ImageCache:
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024) -> None:
+        super().__init__()
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, value: int):
+        self._max_bytes = value
+        self._evict()
+
+    @property
+    def bytes(self):
+        return self._bytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, image, size_bytes: int):
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        self._entries[key] = (image, size_bytes)
+        self._bytes += size_bytes
+        self._evict()
+
+    def _evict(self):
+        # Least recently used first. Sprites already holding an evicted image keep it alive.
+        while self._bytes > self._max_bytes and self._entries:
+            self._bytes -= self._entries.popitem(last=False)[1][1]
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self._max_bytes,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def __str__(self) -> str:
+        return str(self.stats())
+
 
 class ImageHelper:
+    # Shared by every screen, keyed by (path, size, transpose, resample, crop box)
+    cache = ImageCache()
+    atlas = None
+    # Threads used by the bulk loaders to decode and resize, 0 keeps them sequential.
+    # PIL releases the GIL while decoding and resampling, only PhotoImage creation
+    # has to stay on the Tk thread.
+    workers = 0
+
     @classmethod
     def slice(cls, img_path: str, destination: str, columns: int, rows: int = 1,transpose:bool=False):
         filename, file_extension = os.path.splitext(img_path)
@@ -35,47 +112,131 @@ class ImageHelper:
 
     @classmethod
     def slice_to_list(cls, img_path: str, columns: int, rows: int = 1,
-                      width:int=32,height:int=32,transpose: bool = False):
-        images = []
+                      width:int=32,height:int=32,transpose: bool = False, workers: int = None):
+        keys = [cls.frame_key(img_path, columns, rows, col, row, width, height, transpose)
+                for row in range(0, rows) for col in range(0, columns)]
+        images = [cls.lookup(key) for key in keys]
+        if any(image is None for image in images):
+            frames = dict(cls.load_frames(img_path, columns, rows, width, height, transpose, workers))
+            for index, key in enumerate(keys):
+                if images[index] is None:
+                    images[index] = cls.photo(frames[key])
+                    cls.cache.put(key, images[index], width * height * 4)
+        if transpose:
+            images.reverse()
+        return images
+
+    @classmethod
+    def get_sized_image(cls, image_file: str, width: int, height: int,
+                        resample: Image.Resampling = Image.Resampling.LANCZOS):
+        key = cls.sized_key(image_file, width, height, resample)
+        img = cls.lookup(key)
+        if img is None:
+            img = cls.photo(cls.load_sized(image_file, width, height, resample))
+            cls.cache.put(key, img, width * height * 4)
+        return img
+
+    @staticmethod
+    def sized_key(image_file: str, width: int, height: int,
+                  resample: Image.Resampling = Image.Resampling.LANCZOS):
+        return image_file, (width, height), False, resample, None
+
+    @staticmethod
+    def frame_key(img_path: str, columns: int, rows: int, col: int, row: int,
+                  width: int, height: int, transpose: bool):
+        return img_path, (width, height), transpose, Image.Resampling.LANCZOS, (columns, rows, col, row)
+
+    @staticmethod
+    def load_sized(image_file: str, width: int, height: int,
+                   resample: Image.Resampling = Image.Resampling.LANCZOS):
+        img = Image.open(image_file)
+        return img.resize((width, height), resample)
+
+    @classmethod
+    def load_frames(cls, img_path: str, columns: int, rows: int,
+                    width: int, height: int, transpose: bool, workers: int = None):
+        # Decodes a sheet into (key, PIL image) pairs, row by row, without touching Tk
         im = Image.open(img_path)
         if transpose:
             im = im.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+        im.load()
         imgwidth, imgheight = im.size
         frame_height = imgheight // rows
         frame_width = imgwidth // columns
-        for row in range(0, rows):
-            for col in range(0, columns):
-                box = (col * frame_width, row * frame_height, (col + 1) * frame_width, (row + 1) * frame_height)
-                a = im.crop(box)
-                a = a.resize((width,height),Image.Resampling.LANCZOS)
-                image = ImageTk.PhotoImage(a)
-                if transpose:
-                    images.insert(0, image)
-                else:
-                    images.append(image)
-        return images
+
+        def crop(cell):
+            row, col = cell
+            box = (col * frame_width, row * frame_height, (col + 1) * frame_width, (row + 1) * frame_height)
+            a = im.crop(box)
+            return a.resize((width, height), Image.Resampling.LANCZOS)
+
+        cells = [(row, col) for row in range(0, rows) for col in range(0, columns)]
+        return [(cls.frame_key(img_path, columns, rows, col, row, width, height, transpose), a)
+                for (row, col), a in zip(cells, cls.batch_map(crop, cells, workers))]
+
+    @classmethod
+    def use_atlas(cls, atlas):
+        cls.atlas = atlas
 
     @staticmethod
-    def get_sized_image(image_file: str, width: int, height: int):
-        img = Image.open(image_file)
-        img = img.resize((width, height), Image.Resampling.LANCZOS)
-        img = ImageTk.PhotoImage(img)
+    def photo(image: Image.Image):
+        # The size comes from PIL, so not even the first width() goes to Tcl
+        return ImageHandle(ImageTk.PhotoImage(image), image.width, image.height)
+
+    @classmethod
+    def lookup(cls, key):
+        # Cache first, then the pre-scaled atlas, None if the image has to be decoded
+        img = cls.cache.get(key)
+        if img is None and cls.atlas is not None and key in cls.atlas:
+            img = cls.photo(cls.atlas.get_image(key))
+            cls.cache.put(key, img, key[1][0] * key[1][1] * 4)
         return img
 
+    @staticmethod
+    def composite(sprites: list, width: int, height: int, bg_color: str = '', origin: tuple = (0, 0)):
+        # Flattens sprites that never change into a single image, drawn in list
+        # order the same way Sprite.draw puts them on a canvas. The image's top
+        # left corner is at origin, anything outside it is cut off.
+        origin_x, origin_y = origin
+        layer = Image.new('RGBA', (width, height), bg_color or (0, 0, 0, 0))
+        draw = ImageDraw.Draw(layer)
+        for sprite in sprites:
+            outline = sprite.border_color if sprite.border_width > 0 else None
+            x = sprite.x - origin_x
+            y = sprite.y - origin_y
+            if sprite.fill_color or outline:
+                draw.rectangle((x, y, x + sprite.width - 1, y + sprite.height - 1),
+                               fill=sprite.fill_color or None, outline=outline,
+                               width=sprite.border_width)
+            if sprite.image is not None:
+                photo = sprite.image.photo if isinstance(sprite.image, ImageHandle) else sprite.image
+                image = ImageTk.getimage(photo)
+                layer.alpha_composite(image, (max(x, 0), max(y, 0)), (max(-x, 0), max(-y, 0)))
+        return ImageHelper.photo(layer)
+
     @classmethod
-    def get_sized_images(cls, image_files: list, width: int, height: int):
-        images = []
-        for image_name in image_files:
-            image = cls.get_sized_image(image_name, width, height)
-            images.append(image)
+    def get_sized_images(cls, image_files: list, width: int, height: int, workers: int = None):
+        keys = [cls.sized_key(image_name, width, height) for image_name in image_files]
+        images = [cls.lookup(key) for key in keys]
+        missing = [index for index, image in enumerate(images) if image is None]
+        decoded = cls.batch_map(lambda index: cls.load_sized(image_files[index], width, height), missing, workers)
+        for index, img in zip(missing, decoded):
+            images[index] = cls.photo(img)
+            cls.cache.put(keys[index], images[index], width * height * 4)
         return images
 
     @classmethod
     def get_sized_images_in_range(cls, file_path: str, start_number: int,
                                   end_number: int,
-                                  extension: str,width: int, height: int):
-        images = []
-        for i in range(start_number, end_number + 1):
-            image = cls.get_sized_image('{}/{}.{}'.format(file_path, i, extension), width, height)
-            images.append(image)
-        return images
\ No newline at end of file
+                                  extension: str,width: int, height: int, workers: int = None):
+        image_files = ['{}/{}.{}'.format(file_path, i, extension) for i in range(start_number, end_number + 1)]
+        return cls.get_sized_images(image_files, width, height, workers)
+
+    @classmethod
+    def batch_map(cls, func, items: list, workers: int = None):
+        # Runs the PIL side of a bulk load, results come back in input order
+        workers = cls.workers if workers is None else workers
+        if workers and len(items) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                return list(pool.map(func, items))
+        return [func(item) for item in items]
\ No newline at end of file
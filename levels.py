@@ -0,0 +1,217 @@
+import json
+import os
+import struct
+
+WALL = "wall"
+PILL = "pill"
+BLANK = "blank"
+FRUIT = "fruit"
+
+# One byte per cell in a compiled level
+BLANK_CODE = 0
+WALL_CODE = 1
+PILL_CODE = 2
+FRUIT_CODE = 3
+CELL_NAMES = (BLANK, WALL, PILL, FRUIT)
+CELL_CODES = {name: code for code, name in enumerate(CELL_NAMES)}
+
+# Map characters. P is a pill cell Pac-Man starts on, G an empty cell a ghost starts on.
+LEGEND = {'#': WALL_CODE, '.': PILL_CODE, ' ': BLANK_CODE, '_': BLANK_CODE, 'o': FRUIT_CODE,
+          'P': PILL_CODE, 'G': BLANK_CODE}
+CELL_CHARS = '_#.o'
+GHOST_COLORS = ('red', 'green', 'yellow', 'pink')
+
+LEVEL_PATH = 'levels'
+CLASSIC_LEVEL = os.path.join(LEVEL_PATH, 'classic.txt')
+COMPILED_MAGIC = b'PACLVL\x01\x00'
+# source mtime_ns, source size, rows, columns, metadata length
+COMPILED_HEADER = struct.Struct('<qqIII')
+
+_INVALID = 255
+_TRANSLATE = bytes(LEGEND.get(chr(byte), _INVALID) for byte in range(256))
+_WALL_MASK = bytes(int(code == WALL_CODE) for code in range(256))
+
+
+class Level:
+    # A maze as one bytearray of cell codes, row after row, plus what the
+    # engine needs to know about it. Nothing is stored per cell but that byte.
+    def __init__(self, rows: int, columns: int, cells: bytearray, name: str = '',
+                 pacman: tuple = None, ghosts: list = None, path: str = None) -> None:
+        super().__init__()
+        if len(cells) != rows * columns:
+            raise ValueError(f'{len(cells)} cells do not make {rows}x{columns}')
+        self.rows = rows
+        self.columns = columns
+        self.cells = cells
+        self.name = name
+        # Spawns are pixel positions, pacman is (x, y), each ghost (x, y, color)
+        self.pacman = pacman
+        self.ghosts = ghosts if ghosts is not None else []
+        self.path = path
+        # The arguments of generate_level for a generated maze, enough to make it again
+        self.recipe = None
+        self._walls = None
+
+    @property
+    def pill_count(self):
+        return self.cells.count(PILL_CODE)
+
+    @property
+    def walls(self):
+        # 1 for every wall cell, 0 elsewhere, in the same layout as cells
+        if self._walls is None:
+            self._walls = bytearray(self.cells.translate(_WALL_MASK))
+        return self._walls
+
+    @property
+    def wall_count(self):
+        return self.cells.count(WALL_CODE)
+
+    def cell(self, row: int, col: int):
+        return CELL_NAMES[self.cells[row * self.columns + col]]
+
+    def is_wall(self, row: int, col: int):
+        return 0 <= row < self.rows and 0 <= col < self.columns \
+               and self.cells[row * self.columns + col] == WALL_CODE
+
+    def to_grid(self):
+        # The list of lists PacmanEngine plays on, sharing the four name strings
+        names = CELL_NAMES.__getitem__
+        columns = self.columns
+        cells = self.cells
+        return [list(map(names, cells[start:start + columns])) for start in range(0, len(cells), columns)]
+
+    @classmethod
+    def from_grid(cls, grid: list, name: str = '', pacman: tuple = None, ghosts: list = None):
+        codes = CELL_CODES.__getitem__
+        cells = bytearray()
+        for row in grid:
+            cells.extend(map(codes, row))
+        return cls(len(grid), len(grid[0]) if grid else 0, cells, name, pacman, ghosts)
+
+    def to_text(self):
+        lines = [f'name {self.name}'] if self.name else []
+        if self.pacman is not None:
+            lines.append('pacman {} {}'.format(*self.pacman))
+        lines.extend('ghost {} {} {}'.format(*ghost) for ghost in self.ghosts)
+        lines.append('map')
+        text = self.cells.translate(bytes(ord(CELL_CHARS[code]) if code < len(CELL_CHARS) else ord('?')
+                                          for code in range(256))).decode('ascii')
+        lines.extend(text[start:start + self.columns] for start in range(0, len(text), self.columns))
+        return '\n'.join(lines) + '\n'
+
+    @classmethod
+    def parse(cls, source: bytes, path: str = None, cell_size: int = 16, offset: int = 3, sprite_size: int = 12):
+        # Header lines of "key values", ';' starting a comment, then "map" and one
+        # line per row. The rows are translated to cell codes in one pass over
+        # the bytes, so even a 2000x2000 map never becomes Python objects.
+        source = source.replace(b'\r', b'')
+        header, separator, body = source.partition(b'\nmap\n')
+        if not separator:
+            if source.startswith(b'map\n'):
+                header, body = b'', source[4:]
+            else:
+                raise ValueError(f'{path or "level"}: no "map" line')
+        name = ''
+        pacman = None
+        ghosts = []
+        for number, line in enumerate(header.decode('utf-8').splitlines(), 1):
+            words = line.split()
+            if not words or words[0].startswith(';'):
+                continue
+            if words[0] == 'name':
+                name = line.split(None, 1)[1] if len(words) > 1 else ''
+            elif words[0] == 'pacman':
+                pacman = (int(words[1]), int(words[2]))
+            elif words[0] == 'ghost':
+                ghosts.append((int(words[1]), int(words[2]), words[3] if len(words) > 3 else
+                               GHOST_COLORS[len(ghosts) % len(GHOST_COLORS)]))
+            else:
+                raise ValueError(f'{path or "level"}:{number}: unknown header "{words[0]}"')
+
+        rows = body.split(b'\n')
+        while rows and not rows[-1]:
+            rows.pop()
+        columns = max((len(row) for row in rows), default=0)
+        text = b''.join(row.ljust(columns) for row in rows)
+        cells = bytearray(text.translate(_TRANSLATE))
+        bad = cells.find(_INVALID)
+        if bad >= 0:
+            row, col = divmod(bad, columns)
+            raise ValueError(f'{path or "level"}: unknown map character {chr(text[bad])!r} at row {row}, column {col}')
+
+        # Spawn markers give cells, they become pixel positions centred in the cell
+        def spawn_at(index):
+            return cls.spawn_point(*divmod(index, columns), cell_size, offset, sprite_size)
+
+        marker = text.find(b'P')
+        if pacman is None and marker >= 0:
+            pacman = spawn_at(marker)
+        marker = text.find(b'G')
+        while marker >= 0:
+            ghosts.append(spawn_at(marker) + (GHOST_COLORS[len(ghosts) % len(GHOST_COLORS)],))
+            marker = text.find(b'G', marker + 1)
+        return cls(len(rows), columns, cells, name, pacman, ghosts, path)
+
+    @staticmethod
+    def spawn_point(row: int, col: int, cell_size: int = 16, offset: int = 3, sprite_size: int = 12):
+        # The pixel position that centres a sprite in a cell
+        inset = (cell_size - sprite_size) // 2
+        return offset + col * cell_size + inset, offset + row * cell_size + inset
+
+    def save_compiled(self, compiled_path: str, stamp: tuple = (0, 0)):
+        metadata = json.dumps({'name': self.name, 'pacman': self.pacman, 'ghosts': self.ghosts,
+                               'pills': self.pill_count}).encode('utf-8')
+        temporary = compiled_path + '.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(COMPILED_MAGIC)
+            file.write(COMPILED_HEADER.pack(stamp[0], stamp[1], self.rows, self.columns, len(metadata)))
+            file.write(metadata)
+            file.write(self.cells)
+        # Readers never see a half written cache
+        os.replace(temporary, compiled_path)
+
+    @classmethod
+    def load_compiled(cls, compiled_path: str, stamp: tuple = None, path: str = None):
+        # None when the cache is missing, damaged or was built from another version of the source
+        try:
+            with open(compiled_path, 'rb') as file:
+                if file.read(len(COMPILED_MAGIC)) != COMPILED_MAGIC:
+                    return None
+                mtime, size, rows, columns, metadata_length = COMPILED_HEADER.unpack(
+                    file.read(COMPILED_HEADER.size))
+                if stamp is not None and (mtime, size) != stamp:
+                    return None
+                metadata = json.loads(file.read(metadata_length))
+                cells = bytearray(file.read())
+        except (OSError, ValueError, struct.error):
+            return None
+        if len(cells) != rows * columns:
+            return None
+        pacman = tuple(metadata['pacman']) if metadata['pacman'] is not None else None
+        return cls(rows, columns, cells, metadata['name'], pacman,
+                   [tuple(ghost) for ghost in metadata['ghosts']], path)
+
+    @classmethod
+    def load(cls, path: str, use_cache: bool = True):
+        # The compiled form sits next to the source as .lvl and is used while
+        # the source keeps its modification time and size
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        compiled_path = os.path.splitext(path)[0] + '.lvl'
+        if use_cache:
+            level = cls.load_compiled(compiled_path, stamp, path)
+            if level is not None:
+                return level
+        with open(path, 'rb') as file:
+            level = cls.parse(file.read(), path)
+        if use_cache:
+            try:
+                level.save_compiled(compiled_path, stamp)
+            except OSError:
+                pass
+        return level
+
+    def __str__(self) -> str:
+        return "name: {}, size: {}x{}, pills: {}, ghosts: {}".format(self.name, self.rows, self.columns,
+                                                                    self.pill_count, len(self.ghosts))
@@ -0,0 +1,257 @@
+import argparse
+import random
+from time import perf_counter
+
+from spritelib_v4 import *
+from levels import *
+
+# The stock maze has 4 ghosts on 31x28 cells
+CLASSIC_GHOST_DENSITY = 4 / (31 * 28)
+# Cells between Pac-Man and ghosts that start outside the house, about the stock window's width
+SAFE_DISTANCE = 28
+
+_SPARE = b'\x05'
+_BITS = bytes(int(byte == ord('1')) for byte in range(256))
+
+
+class MazeGenerator:
+    # Pac-Man style mazes of any size: one cell wide corridors between wall
+    # blocks wall_width thick, no dead ends, a ghost house in the middle.
+    # Corridors run between nodes on a lattice, every step cells apart. The
+    # nodes are first joined by a spanning tree, so every corridor is reachable,
+    # then loops are added and dead ends opened up until the maze is braided.
+    # The same seed always gives the same maze.
+    def __init__(self, rows: int, columns: int, seed: int = None, wall_width: int = 2,
+                 loops: float = 0.1, ghost_density: float = None) -> None:
+        super().__init__()
+        if wall_width < 1:
+            raise ValueError('walls must be at least one cell wide')
+        if not 0 <= loops <= 1:
+            raise ValueError('loops is the share of walls to open, between 0 and 1')
+        self.rows = rows
+        self.columns = columns
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.random = random.Random(self.seed)
+        self.wall_width = wall_width
+        self.loops = loops
+        # Ghosts per cell, None for the 4 of the stock maze whatever the size
+        self.ghost_density = ghost_density
+        self.step = wall_width + 1
+        self.node_rows = (rows - 3) // self.step + 1
+        self.node_columns = (columns - 3) // self.step + 1
+        # A classic size ghost house, 5x8 cells with 2 cell corridors, spans 2x3 nodes
+        self.house_rows = -(-6 // self.step)
+        self.house_columns = -(-9 // self.step)
+        if self.node_rows < self.house_rows + 3 or self.node_columns < self.house_columns + 3:
+            raise ValueError(f'{rows}x{columns} is too small for a maze with a ghost house')
+        # The lattice is centred, the cells left over go to the outer walls
+        self.top = 1 + (rows - 3 - (self.node_rows - 1) * self.step) // 2
+        self.left = 1 + (columns - 3 - (self.node_columns - 1) * self.step) // 2
+        self.house_top = (self.node_rows - self.house_rows) // 2
+        self.house_left = (self.node_columns - self.house_columns) // 2
+        # One byte per node, 1 where its corridor goes on to the node to the east, or to the south
+        count = self.node_rows * self.node_columns
+        self.east = bytearray(count)
+        self.south = bytearray(count)
+
+    def in_house(self, row: int, col: int):
+        # Nodes inside the ring of corridor around the ghost house
+        return self.house_top < row < self.house_top + self.house_rows \
+               and self.house_left < col < self.house_left + self.house_columns
+
+    def link(self, row: int, col: int, direction: Direction):
+        # Opens the corridor from a node to its neighbour.
+        # False when the neighbour is off the lattice or inside the ghost house.
+        target_row = row + (direction is Direction.DOWN) - (direction is Direction.UP)
+        target_col = col + (direction is Direction.RIGHT) - (direction is Direction.LEFT)
+        if not (0 <= target_row < self.node_rows and 0 <= target_col < self.node_columns) \
+                or self.in_house(row, col) or self.in_house(target_row, target_col):
+            return False
+        if direction is Direction.LEFT or direction is Direction.RIGHT:
+            self.east[row * self.node_columns + min(col, target_col)] = 1
+        else:
+            self.south[min(row, target_row) * self.node_columns + col] = 1
+        return True
+
+    def carve_tree(self):
+        # Sidewinder: each row is cut into runs joined east to west, and every
+        # run is joined to the row above at one random node. The top row is one run.
+        columns = self.node_columns
+        rng = self.random
+        self.east[:columns - 1] = b'\x01' * (columns - 1)
+        for row in range(1, self.node_rows):
+            base = row * columns
+            bits = format(rng.getrandbits(columns - 1), 'b').zfill(columns - 1).encode('ascii').translate(_BITS)
+            self.east[base:base + columns - 1] = bits
+            start = 0
+            for run in bits.split(b'\x00'):
+                end = start + len(run)
+                self.south[base - columns + start + int(rng.random() * (end - start + 1))] = 1
+                start = end + 1
+
+    def carve_house(self):
+        # A ring of corridor around the house, nothing inside it. Paths that used
+        # to cross the middle now go round the ring, so nothing is cut off.
+        top, left = self.house_top, self.house_left
+        bottom, right = top + self.house_rows, left + self.house_columns
+        for col in range(left, right):
+            self.link(top, col, Direction.RIGHT)
+            self.link(bottom, col, Direction.RIGHT)
+        for row in range(top, bottom):
+            self.link(row, left, Direction.DOWN)
+            self.link(row, right, Direction.DOWN)
+        columns = self.node_columns
+        for row in range(top + 1, bottom):
+            self.east[row * columns + left:row * columns + right] = bytes(right - left)
+        for row in range(top, bottom):
+            self.south[row * columns + left + 1:row * columns + right] = bytes(right - left - 1)
+
+    def add_loops(self):
+        # Knocks through random walls, more loops give ghosts more ways round
+        rng = self.random
+        directions = (Direction.RIGHT, Direction.DOWN)
+        for _ in range(int(self.loops * self.node_rows * self.node_columns)):
+            self.link(rng.randrange(self.node_rows), rng.randrange(self.node_columns), rng.choice(directions))
+
+    def braid(self):
+        # Every dead end is opened towards a neighbour it is not joined to yet
+        rows, columns = self.node_rows, self.node_columns
+        east, south = self.east, self.south
+        rng = self.random
+        for row in range(rows):
+            for col in range(columns):
+                index = row * columns + col
+                exits = east[index] + south[index] + (col > 0 and east[index - 1]) + (row > 0 and south[index - columns])
+                if exits != 1 or self.in_house(row, col):
+                    continue
+                closed = []
+                if col + 1 < columns and not east[index]:
+                    closed.append(Direction.RIGHT)
+                if row + 1 < rows and not south[index]:
+                    closed.append(Direction.DOWN)
+                if col > 0 and not east[index - 1]:
+                    closed.append(Direction.LEFT)
+                if row > 0 and not south[index - columns]:
+                    closed.append(Direction.UP)
+                rng.shuffle(closed)
+                for direction in closed:
+                    if self.link(row, col, direction):
+                        break
+
+    def render(self):
+        # The links become cells a whole row at a time. Each node and the gap
+        # after it is a segment, picked for every node in one bytes.replace.
+        rows, columns, step = self.rows, self.columns, self.step
+        node_columns = self.node_columns
+        width = (node_columns - 1) * step + 1
+        corridor = bytes([PILL_CODE]) * step
+        blocked = bytes([PILL_CODE]) + bytes([WALL_CODE]) * self.wall_width
+        walled = bytes([WALL_CODE]) * step
+        cells = bytearray([WALL_CODE]) * (rows * columns)
+        for node_row in range(self.node_rows):
+            base = node_row * node_columns
+            links = bytes(self.east[base:base + node_columns])
+            line = links.replace(b'\x00', _SPARE).replace(b'\x01', corridor).replace(_SPARE, blocked)
+            start = (self.top + node_row * step) * columns + self.left
+            cells[start:start + width] = line[:width]
+            if node_row == self.node_rows - 1:
+                break
+            links = bytes(self.south[base:base + node_columns])
+            line = links.replace(b'\x00', _SPARE).replace(b'\x01', blocked).replace(_SPARE, walled)
+            for gap in range(1, step):
+                cells[start + gap * columns:start + gap * columns + width] = line[:width]
+        return cells
+
+    def build_house(self, cells: bytearray):
+        # Walls one cell in from the ring, empty inside, a two cell door in the middle of the top
+        columns = self.columns
+        top = self.top + self.house_top * self.step + 1
+        bottom = self.top + (self.house_top + self.house_rows) * self.step - 1
+        left = self.left + self.house_left * self.step + 1
+        right = self.left + (self.house_left + self.house_columns) * self.step - 1
+        width = right - left + 1
+        inside = bytes([WALL_CODE]) + bytes([BLANK_CODE]) * (width - 2) + bytes([WALL_CODE])
+        for row in range(top, bottom + 1):
+            edge = row == top or row == bottom
+            cells[row * columns + left:row * columns + right + 1] = bytes([WALL_CODE]) * width if edge else inside
+        door = top * columns + left + width // 2 - 1
+        cells[door:door + 2] = bytes([BLANK_CODE]) * 2
+        return [(row, col) for row in range(top + 1, bottom) for col in range(left + 1, right)]
+
+    def ghost_count(self):
+        if self.ghost_density is None:
+            return len(GHOST_COLORS)
+        return max(1, round(self.rows * self.columns * self.ghost_density))
+
+    def spawns(self, house: list):
+        # Pac-Man under the house like in the stock game. The first ghosts wait
+        # in the house, the rest start on nodes well away from Pac-Man.
+        pacman_row = self.house_top + self.house_rows
+        pacman_col = self.house_left + self.house_columns // 2
+        pacman = Level.spawn_point(self.top + pacman_row * self.step, self.left + pacman_col * self.step)
+        middle = house[len(house) // 2 - 2:len(house) // 2 + 2]
+        count = self.ghost_count()
+        cells = [middle[index % len(middle)] for index in range(min(count, len(GHOST_COLORS)))]
+        extra = count - len(cells)
+        if extra > 0:
+            # Nearer than SAFE_DISTANCE only when a small maze has no room further out
+            node_count = self.node_rows * self.node_columns
+            safe = SAFE_DISTANCE // self.step
+            far = []
+            near = []
+            for index in self.random.sample(range(node_count), min(node_count, extra * 2 + 64)):
+                row, col = divmod(index, self.node_columns)
+                distance = abs(row - pacman_row) + abs(col - pacman_col)
+                if distance > 1 and not self.in_house(row, col):
+                    (far if distance > safe else near).append((self.top + row * self.step,
+                                                               self.left + col * self.step))
+            cells.extend((far + near)[:extra])
+        ghosts = [Level.spawn_point(row, col) + (GHOST_COLORS[index % len(GHOST_COLORS)],)
+                  for index, (row, col) in enumerate(cells)]
+        return pacman, ghosts
+
+    def generate(self, name: str = None):
+        self.carve_tree()
+        self.carve_house()
+        self.add_loops()
+        self.braid()
+        cells = self.render()
+        pacman, ghosts = self.spawns(self.build_house(cells))
+        if name is None:
+            name = f'Generated {self.rows}x{self.columns} seed {self.seed}'
+        level = Level(self.rows, self.columns, cells, name, pacman, ghosts)
+        level.recipe = {'rows': self.rows, 'columns': self.columns, 'seed': self.seed,
+                        'wall_width': self.wall_width, 'loops': self.loops,
+                        'ghost_density': self.ghost_density, 'name': name}
+        return level
+
+
+def generate_level(rows: int, columns: int, seed: int = None, wall_width: int = 2, loops: float = 0.1,
+                   ghost_density: float = None, name: str = None):
+    return MazeGenerator(rows, columns, seed, wall_width, loops, ghost_density).generate(name)
+
+
+def generate_grid(rows: int, columns: int, seed: int = None, **options):
+    # The same lists of WALL, PILL and BLANK that pacman_grid returns
+    return generate_level(rows, columns, seed, **options).to_grid()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a Pac-Man style maze as a level file')
+    parser.add_argument('rows', type=int)
+    parser.add_argument('columns', type=int)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--wall-width', type=int, default=2)
+    parser.add_argument('--loops', type=float, default=0.1, help='share of extra walls to knock through')
+    parser.add_argument('--ghosts', type=float, help='ghosts per cell, e.g. %.4f like the stock maze'
+                                                     % CLASSIC_GHOST_DENSITY)
+    parser.add_argument('--out', help='write the level here, e.g. levels/big.txt')
+    args = parser.parse_args()
+    start = perf_counter()
+    level = generate_level(args.rows, args.columns, args.seed, args.wall_width, args.loops, args.ghosts)
+    print(f'{level} in {(perf_counter() - start) * 1000:.0f} ms')
+    if args.out:
+        with open(args.out, 'w') as file:
+            file.write(level.to_text())
+    elif args.rows * args.columns <= 100 * 100:
+        print(level.to_text(), end='')
@@ -0,0 +1,92 @@
+from array import array
+from collections import OrderedDict, deque
+
+from spritelib_v4 import *
+from entitystore import DIRECTIONS, DIRECTION_CODES
+
+_LEFT = DIRECTION_CODES[Direction.LEFT]
+_RIGHT = DIRECTION_CODES[Direction.RIGHT]
+_UP = DIRECTION_CODES[Direction.UP]
+_DOWN = DIRECTION_CODES[Direction.DOWN]
+
+
+class DistanceField:
+    # Steps from every open cell to one target cell, found with a single BFS.
+    # codes holds, per cell, the DIRECTION_CODES value of the first move on a
+    # shortest path to the target, 0 (STOPPED) on the target or where unreachable.
+    def __init__(self, open_cells: bytearray, rows: int, columns: int, target: tuple) -> None:
+        super().__init__()
+        self.rows = rows
+        self.columns = columns
+        self.target = target
+        size = rows * columns
+        self.distances = array('i', [-1]) * size
+        self.codes = bytearray(size)
+        if not self._inside(*target):
+            return
+        start = target[0] * columns + target[1]
+        if not open_cells[start]:
+            return
+        distances = self.distances
+        codes = self.codes
+        distances[start] = 0
+        queue = deque([start])
+        last_col = columns - 1
+        last_row = rows - 1
+        while queue:
+            index = queue.popleft()
+            row, col = divmod(index, columns)
+            distance = distances[index] + 1
+            # A ghost in the neighbour reaches this cell by moving back towards it
+            for neighbour, code, inside in ((index - 1, _RIGHT, col > 0),
+                                            (index + 1, _LEFT, col < last_col),
+                                            (index - columns, _DOWN, row > 0),
+                                            (index + columns, _UP, row < last_row)):
+                if inside and open_cells[neighbour] and distances[neighbour] < 0:
+                    distances[neighbour] = distance
+                    codes[neighbour] = code
+                    queue.append(neighbour)
+
+    def _inside(self, row: int, col: int):
+        return 0 <= row < self.rows and 0 <= col < self.columns
+
+    def distance(self, row: int, col: int):
+        if not self._inside(row, col):
+            return -1
+        return self.distances[row * self.columns + col]
+
+    def direction(self, row: int, col: int):
+        if not self._inside(row, col):
+            return Direction.STOPPED
+        return DIRECTIONS[self.codes[row * self.columns + col]]
+
+
+class Navigator:
+    def __init__(self, grid: list, wall, max_fields: int = 64) -> None:
+        super().__init__()
+        self.rows = len(grid)
+        self.columns = len(grid[0]) if grid else 0
+        # Only walls block, so eating pills never invalidates a cached field
+        self.open_cells = bytearray(cell != wall for row in grid for cell in row)
+        self.max_fields = max_fields
+        self._fields = OrderedDict()
+
+    def field_to(self, target: tuple):
+        field = self._fields.get(target)
+        if field is None:
+            field = DistanceField(self.open_cells, self.rows, self.columns, target)
+            self._fields[target] = field
+            if len(self._fields) > self.max_fields:
+                self._fields.popitem(last=False)
+        else:
+            self._fields.move_to_end(target)
+        return field
+
+    def direction(self, cell: tuple, target: tuple):
+        return self.field_to(target).direction(*cell)
+
+    def clear(self):
+        self._fields.clear()
+
+    def __len__(self):
+        return len(self._fields)
@@ -1,18 +1,156 @@
-
+import heapq
+from itertools import count
 from threading import Thread
-from time import sleep
+from time import sleep, monotonic
+
+# Set by Scheduler.install(), call_later and call_later_with_param then run on
+# the Tk event loop instead of starting a thread per call
+default_scheduler = None
+
 
 def call_later(delay,func):
+    if default_scheduler is not None:
+        return default_scheduler.call_later(delay, func)
     def delay_timer():
         sleep(delay)
         func()
     thread = Thread(target=delay_timer)
     thread.start()
-    
+
 def call_later_with_param(delay,func,param):
+    if default_scheduler is not None:
+        return default_scheduler.call_later(delay, func, param)
     def delay_timer():
         sleep(delay)
         func(param)
     thread = Thread(target=delay_timer)
     thread.start()
 
+
+class Timer:
+    def __init__(self, deadline: float, func, args: tuple, interval: float = None, key=None) -> None:
+        super().__init__()
+        self.deadline = deadline
+        self.func = func
+        self.args = args
+        self.interval = interval
+        self.key = key
+        self._cancelled = False
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def cancel(self):
+        self._cancelled = True
+
+    def __str__(self) -> str:
+        return "deadline: {}, interval: {}, key: {}, cancelled: {}".format(self.deadline, self.interval, self.key,
+                                                                          self._cancelled)
+
+
+class Scheduler:
+    def __init__(self, widget) -> None:
+        super().__init__()
+        self._widget = widget
+        self._heap = []
+        self._keys = {}
+        self._order = count()
+        self._after_id = None
+        self._after_deadline = None
+
+    def install(self):
+        global default_scheduler
+        default_scheduler = self
+        return self
+
+    def call_later(self, delay: float, func, *args, key=None):
+        # A pending timer with the same key is reused instead of adding a duplicate
+        return self._add(delay, func, args, None, key)
+
+    def call_every(self, interval: float, func, *args, key=None):
+        # A repeating timer runs at most once per pass, however far behind it is
+        return self._add(interval, func, args, interval, key)
+
+    def cancel(self, timer: Timer):
+        timer.cancel()
+        if timer.key is not None and self._keys.get(timer.key) is timer:
+            del self._keys[timer.key]
+
+    def cancel_all(self):
+        for deadline, order, timer in self._heap:
+            timer.cancel()
+        self._heap = []
+        self._keys = {}
+        if self._after_id is not None:
+            self._widget.after_cancel(self._after_id)
+            self._after_id = None
+            self._after_deadline = None
+
+    @property
+    def pending(self):
+        return sum(1 for deadline, order, timer in self._heap if not timer.cancelled)
+
+    def _add(self, delay: float, func, args: tuple, interval: float, key):
+        if interval is not None and interval <= 0:
+            raise ValueError(f'interval must be positive, not {interval}')
+        if key is not None:
+            timer = self._keys.get(key)
+            if timer is not None and not timer.cancelled:
+                return timer
+        timer = Timer(monotonic() + delay, func, args, interval, key)
+        if key is not None:
+            self._keys[key] = timer
+        heapq.heappush(self._heap, (timer.deadline, next(self._order), timer))
+        self._wake()
+        return timer
+
+    def _wake(self):
+        # Only one after() is ever pending, for the earliest live deadline
+        while self._heap and self._heap[0][2].cancelled:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return
+        deadline = self._heap[0][0]
+        if self._after_id is not None:
+            if self._after_deadline <= deadline:
+                return
+            self._widget.after_cancel(self._after_id)
+        delay_ms = max(0, int((deadline - monotonic()) * 1000))
+        self._after_deadline = deadline
+        self._after_id = self._widget.after(delay_ms, self._run)
+
+    def _run(self):
+        self._after_id = None
+        self._after_deadline = None
+        now = monotonic()
+        # Only what was due when this pass started, timers added or rescheduled
+        # while it runs wait for the next after()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, order, timer = heapq.heappop(self._heap)
+            if not timer.cancelled:
+                due.append(timer)
+        # A callback that raises does not stop the others, the first error is
+        # raised once they have all run so Tk still reports it
+        error = None
+        for timer in due:
+            if timer.cancelled:
+                continue
+            if timer.interval is not None:
+                # Strictly after now, missed runs are skipped rather than caught up
+                timer.deadline += timer.interval
+                if timer.deadline <= now:
+                    timer.deadline = now + timer.interval
+                heapq.heappush(self._heap, (timer.deadline, next(self._order), timer))
+            elif timer.key is not None and self._keys.get(timer.key) is timer:
+                # Gone before the call, so the key is free again whatever the call does
+                del self._keys[timer.key]
+            try:
+                timer.func(*timer.args)
+            except Exception as exception:
+                if error is None:
+                    error = exception
+        self._wake()
+        if error is not None:
+            raise error
@@ -1,27 +1,78 @@
-from tkinter import *
-from spritelib_v4 import *
-from imagehelper import *
-from nonblockingdelay import *
 import random
-import pygame.mixer as mixer
+from enum import Enum
+from time import perf_counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from spritelib_v4 import *
+from entitystore import *
+from navigation import *
+from levels import *
+
+
+def pacman_grid():
+    W = WALL
+    P = PILL
+    B = BLANK
+    F = FRUIT
+
+    # 10                           #20
+    # 1  2  3  4  5  6  7  8  9  0  1  2  3  4  5  6  7  8  9  0  1  2  3  4  5  6  7  8
+    return [[W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W],  # 1
+            [W, P, P, P, P, P, P, P, P, P, P, P, P, W, W, P, P, P, P, P, P, P, P, P, P, P, P, W],  # 2
+            [W, P, W, W, W, W, P, W, W, W, W, W, P, W, W, P, W, W, W, W, W, P, W, W, W, W, P, W],  # 3
+            [W, P, W, W, W, W, P, W, W, W, W, W, P, W, W, P, W, W, W, W, W, P, W, W, W, W, P, W],  # 4
+            [W, P, W, W, W, W, P, W, W, W, W, W, P, W, W, P, W, W, W, W, W, P, W, W, W, W, P, W],  # 5
+            [W, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, W],  # 6
+            [W, P, W, W, W, W, P, W, W, P, W, W, W, W, W, W, W, W, P, W, W, P, W, W, W, W, P, W],  # 7
+            [W, P, W, W, W, W, P, W, W, P, W, W, W, W, W, W, W, W, P, W, W, P, W, W, W, W, P, W],  # 8
+            [W, P, P, P, P, P, P, W, W, P, P, P, P, W, W, P, P, P, P, W, W, P, P, P, P, P, P, W],  # 9
+            [W, W, W, W, W, W, P, W, W, W, W, W, P, W, W, P, W, W, W, W, W, P, W, W, W, W, W, W],  # 10
+            [W, W, W, W, W, W, P, W, W, W, W, W, P, W, W, P, W, W, W, W, W, P, W, W, W, W, W, W],  # 11
+            [W, W, W, W, W, W, P, W, W, P, P, P, P, P, P, P, P, P, P, W, W, P, W, W, W, W, W, W],  # 12
+            [W, W, W, W, W, W, P, W, W, P, W, W, W, B, B, W, W, W, P, W, W, P, W, W, W, W, W, W],  # 13
+            [W, W, W, W, W, W, P, W, W, P, W, B, B, B, B, B, B, W, P, W, W, P, W, W, W, W, W, W],  # 14
+            [P, P, P, P, P, P, P, P, P, P, W, B, B, B, B, B, B, W, P, P, P, P, P, P, P, P, P, P],  # 15
+            [W, W, W, W, W, W, P, W, W, P, W, B, B, B, B, B, B, W, P, W, W, P, W, W, W, W, W, W],  # 16
+            [W, W, W, W, W, W, P, W, W, P, W, W, W, W, W, W, W, W, P, W, W, P, W, W, W, W, W, W],  # 17
+            [W, W, W, W, W, W, P, W, W, P, P, P, P, P, P, P, P, P, P, W, W, P, W, W, W, W, W, W],  # 18
+            [W, W, W, W, W, W, P, W, W, P, W, W, W, W, W, W, W, W, P, W, W, P, W, W, W, W, W, W],  # 19
+            [W, W, W, W, W, W, P, W, W, P, W, W, W, W, W, W, W, W, P, W, W, P, W, W, W, W, W, W],  # 20
+            [W, P, P, P, P, P, P, P, P, P, P, P, P, W, W, P, P, P, P, P, P, P, P, P, P, P, P, W],  # 21
+            [W, P, W, W, W, W, P, W, W, W, W, W, P, W, W, P, W, W, W, W, W, P, W, W, W, W, P, W],  # 22
+            [W, P, W, W, W, W, P, W, W, W, W, W, P, W, W, P, W, W, W, W, W, P, W, W, W, W, P, W],  # 23
+            [W, P, P, P, W, W, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, W, W, P, P, P, W],  # 24
+            [W, W, W, P, W, W, P, W, W, P, W, W, W, W, W, W, W, W, P, W, W, P, W, W, P, W, W, W],  # 25
+            [W, W, W, P, W, W, P, W, W, P, W, W, W, W, W, W, W, W, P, W, W, P, W, W, P, W, W, W],  # 26
+            [W, P, P, P, P, P, P, W, W, P, P, P, P, W, W, P, P, P, P, W, W, P, P, P, P, P, P, W],  # 27
+            [W, P, W, W, W, W, W, W, W, W, W, W, P, W, W, P, W, W, W, W, W, W, W, W, W, W, P, W],  # 28
+            [W, P, W, W, W, W, W, W, W, W, W, W, P, W, W, P, W, W, W, W, W, W, W, W, W, W, P, W],  # 29
+            [W, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, P, W],  # 30
+            [W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W, W]]  # 31
+
 
 class Monster:
 
-    def __init__(self, images: list, x: int = 0, y: int = 0,
+    def __init__(self, images: list = None, x: int = 0, y: int = 0,
                  border_color: str = 'black', border_width: int = 2,
                  fill_color: str = '',
                  direction: Direction = Direction.RIGHT,
                  delay_time: int = 25, speed: int = 3,
                  frame_delay: int = 100,
                  left_limit: int = 0, right_limit: int = 800,
-                 top_limit: int = 0, bottom_limit: int = 600
+                 top_limit: int = 0, bottom_limit: int = 600,
+                 width: int = 32, height: int = 32, rng=random
                  ) -> None:
         super().__init__()
-        self._sprite = Sprite(x, y, 32, 32, border_color, border_width,
-                              fill_color, images[0])
+        self._sprite = Sprite(x, y, width, height, border_color, border_width,
+                              fill_color, images[0] if images else None)
         self._mover = Mover(self._sprite, direction, delay_time, speed)
-        self._animation = Animation(self._sprite, images, frame_delay)
+        self._animation = Animation(self._sprite, images, frame_delay) if images else None
         self.clamp = Clamp(left_limit, right_limit, top_limit, bottom_limit)
+        self.rng = rng
 
     @property
     def sprite(self):
@@ -36,7 +87,7 @@ class Monster:
         return self._animation
 
     def random_direction(self):
-        random_num = random.randint(1, 4)
+        random_num = self.rng.randint(1, 4)
         if random_num == 1:
             if self._mover.direction is not Direction.RIGHT:
                 self._mover.direction = Direction.LEFT
@@ -53,8 +104,353 @@ class Monster:
     def draw(self, canvas):
         self._sprite.draw(canvas)
 
+    def render(self, canvas):
+        self._sprite.render(canvas)
+
+    def erase(self, canvas):
+        self._sprite.erase(canvas)
+
     def update(self, delta_time):
         self._mover.update(delta_time)
-        self._animation.update(delta_time)
+        if self._animation is not None:
+            self._animation.update(delta_time)
         Clamp.clamp_all(self._sprite, self.clamp.left_limit, self.clamp.right_limit, self.clamp.top_limit,
                         self.clamp.bottom_limit)
+
+
+class GameState(Enum):
+    PLAYING = "Playing"
+    WON = "Won"
+    LOST = "Lost"
+
+
+class GameEvent(Enum):
+    PILL_EATEN = "pill"
+    CAUGHT = "caught"
+    WON = "won"
+
+
+class PacmanEngine:
+    def __init__(self, grid: list = None, seed: int = None, grid_collisions: bool = True,
+                 vectorized: bool = False, chase: bool = False, level: Level = None) -> None:
+        super().__init__()
+        self.source_grid = grid
+        # A Level replaces grid, and its spawn points replace the stock ones
+        self.level = level
+        self.random = random.Random(seed)
+        self.grid_collisions = grid_collisions
+        self.layout = CellLayout(16, 3, 3)
+        self.entities = []
+        self.monsters = []
+        self.spawns = {}
+        # With vectorized=True the monsters are moved, clamped and collided as
+        # numpy arrays in an EntityStore instead of one Mover at a time
+        self.store = EntityStore(seed=self.random.getrandbits(32)) if vectorized else None
+        # With chase=True monsters follow a BFS distance field to Pac-Man's cell
+        # instead of wandering until they hit a wall
+        self.chase = chase
+        self.navigator = None
+        # A FrameProfiler, when set step times its movement and collision passes
+        self.profiler = None
+        # A Recorder, when set it is told about every step and every turn
+        self.recorder = None
+
+        pacman_x, pacman_y = level.pacman if level is not None and level.pacman is not None else (22, 22)
+        self.pacman = MovingSprite(pacman_x, pacman_y, 12, 12, border_color="green", direction=Direction.STOPPED,
+                                   delay_time=25, speed=3)
+        self.entities.append(self.pacman)
+        self.spawns[self.pacman] = (pacman_x, pacman_y, Direction.STOPPED)
+
+        ghosts = level.ghosts if level is not None and level.ghosts else \
+            [(222, 220, "red"), (222, 240, "green"), (222, 220, "yellow"), (222, 240, "pink")]
+        for x, y, color in ghosts:
+            self.add_monster(x, y, color)
+        self.red_monster = self.monster_colored("red")
+        self.green_monster = self.monster_colored("green")
+        self.yellow_monster = self.monster_colored("yellow")
+        self.pink_monster = self.monster_colored("pink")
+
+        self.reset(seed)
+        if level is not None:
+            # A level bigger than the stock window widens everyone's limits to
+            # its own size, the classic level keeps the stock ones
+            self.fit_clamps(shrink=False)
+
+    def add_monster(self, x: int, y: int, border_color: str = "red",
+                    direction: Direction = Direction.UP):
+        monster = Monster(None, x, y, border_color=border_color, direction=direction,
+                          width=12, height=12, rng=self.random)
+        self.monsters.append(monster)
+        self.entities.append(monster)
+        self.spawns[monster] = (x, y, direction)
+        if self.store is not None:
+            self.store.add_entity(monster)
+        return monster
+
+    def monster_colored(self, color: str):
+        for monster in self.monsters:
+            if monster.sprite.border_color == color:
+                return monster
+        return None
+
+    def set_monster_speed(self, speed: int = None, delay_time: int = None):
+        for monster in self.monsters:
+            if speed is not None:
+                monster.mover.speed = speed
+            if delay_time is not None:
+                monster.mover.delay_time = delay_time
+        if self.store is not None:
+            if speed is not None:
+                self.store.speed[:] = abs(speed)
+            if delay_time is not None:
+                self.store.delay_time[:] = delay_time
+
+    def reset(self, seed: int = None):
+        # Every game gets a seed of its own, drawn from the last game's random
+        # numbers unless given, so any game can be replayed from its seed alone
+        self.seed = self.random.getrandbits(32) if seed is None else seed
+        self.random.seed(self.seed)
+        if self.store is not None:
+            self.store.rng = np.random.default_rng(self.random.getrandbits(32))
+        if self.level is not None:
+            self.pacman_grid = self.level.to_grid()
+        elif self.source_grid is None:
+            self.pacman_grid = pacman_grid()
+        else:
+            self.pacman_grid = [list(row) for row in self.source_grid]
+        self.generate_map()
+        if self.chase and self.navigator is None:
+            # Pills come and go but walls never move, so one navigator outlives resets
+            self.navigator = Navigator(self.pacman_grid, WALL)
+        self.target_cell = None
+        self.field = None
+        for entity in self.entities:
+            x, y, direction = self.spawns[entity]
+            entity.sprite.x = x
+            entity.sprite.y = y
+            entity.mover.direction = direction
+            entity.mover.elapsed_time = 0
+        if self.store is not None:
+            self.store.pull()
+            self.store.elapsed_time[:] = 0
+        self.state = GameState.PLAYING
+        self.ticks = 0
+        self.pills_eaten = 0
+        self.events = []
+        if self.recorder is not None:
+            self.recorder.restart(self)
+
+    def generate_map(self):
+        self.pills = {}
+        self.walls = []
+        self.blanks = []
+        self.fruits = []
+
+        ####Generating Map####
+        i = 3
+        k = 3
+        for row in range(0, len(self.pacman_grid)):
+            for col in range(0, len(self.pacman_grid[0])):
+                if self.pacman_grid[row][col] == PILL:
+                    s = Sprite(i + 5, k + 5, fill_color="white", border_width=1, width=4, height=4)
+                    self.pills[(row, col)] = s
+                elif self.pacman_grid[row][col] == WALL:
+                    s = Sprite(i, k, border_color="red", border_width=0, width=16, height=16)
+                    self.walls.append(s)
+                elif self.pacman_grid[row][col] == BLANK:
+                    s = Sprite(i, k, border_color="red", border_width=0, width=16, height=16)
+                    self.blanks.append(s)
+                else:
+                    s = Sprite(i, k, border_color="red", border_width=1, width=16, height=16)
+                    self.fruits.append(s)
+                i += 16
+            k += 16
+            i = 3
+        #####################
+
+        if self.store is not None:
+            self.wall_mask = np.array([[cell == WALL for cell in row] for row in self.pacman_grid], dtype=bool)
+
+    @property
+    def world_width(self):
+        # Up to the right edge of the maze, the offset is only kept on the left
+        return self.layout.offset_x + len(self.pacman_grid[0]) * self.layout.cell_size
+
+    @property
+    def world_height(self):
+        return self.layout.offset_y + len(self.pacman_grid) * self.layout.cell_size
+
+    def fit_clamps(self, shrink: bool = True):
+        right = self.world_width
+        bottom = self.world_height
+        for entity in self.entities:
+            clamp = entity.clamp
+            clamp.right_limit = right if shrink else max(right, clamp.right_limit)
+            clamp.bottom_limit = bottom if shrink else max(bottom, clamp.bottom_limit)
+        if self.store is not None:
+            store = self.store
+            store.right_limit[:] = right if shrink else np.maximum(store.right_limit, right)
+            store.bottom_limit[:] = bottom if shrink else np.maximum(store.bottom_limit, bottom)
+        return self
+
+    @property
+    def number_of_pills(self):
+        return len(self.pills)
+
+    def turn(self, direction: Direction):
+        # Player input goes through here so a recorder sees it
+        self.pacman.mover.direction = direction
+        if self.recorder is not None:
+            self.recorder.record_turn(self.ticks, direction)
+
+    def is_wall(self, row: int, col: int):
+        return 0 <= row < len(self.pacman_grid) and 0 <= col < len(self.pacman_grid[0]) \
+               and self.pacman_grid[row][col] == WALL
+
+    def hit_walls(self, entity):
+        sprite = entity.sprite
+        if self.grid_collisions:
+            size = self.layout.cell_size
+            first_row, last_row, first_col, last_col = self.layout.cells_touching(sprite.bbox())
+            for row in range(first_row, last_row + 1):
+                top = self.layout.offset_y + row * size
+                for col in range(first_col, last_col + 1):
+                    left = self.layout.offset_x + col * size
+                    # Re-test every wall after a backup, the sprite may have moved clear of it
+                    if self.is_wall(row, col) and sprite.intersects_rect(left, top, left + size, top + size):
+                        self.bump(entity)
+        else:
+            for wall in self.walls:
+                if sprite.overlaps(wall):
+                    self.bump(entity)
+
+    def bump(self, entity):
+        entity.mover.backup()
+        if type(entity) == Monster:
+            entity.random_direction()
+
+    def eat_pills(self):
+        sprite = self.pacman.sprite
+        first_row, last_row, first_col, last_col = self.layout.cells_touching(sprite.bbox())
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                pill = self.pills.get((row, col))
+                if pill is not None and sprite.overlaps(pill):
+                    self.pacman_grid[row][col] = BLANK
+                    pill.fill_color = ""
+                    pill.border_width = 0
+                    del self.pills[(row, col)]
+                    self.pills_eaten += 1
+                    self.events.append(GameEvent.PILL_EATEN)
+
+    def update_target(self):
+        # Only look up a new field when Pac-Man has moved into another cell
+        sprite = self.pacman.sprite
+        target = self.layout.cell_at(sprite.x + sprite.width // 2, sprite.y + sprite.height // 2)
+        if target != self.target_cell:
+            self.target_cell = target
+            self.field = self.navigator.field_to(target)
+
+    def steer_monsters(self):
+        # Monsters only turn while wholly inside one cell, so a turn never clips a wall
+        for monster in self.monsters:
+            first_row, last_row, first_col, last_col = self.layout.cells_touching(monster.sprite.bbox())
+            if first_row == last_row and first_col == last_col:
+                direction = self.field.direction(first_row, first_col)
+                if direction is not Direction.STOPPED:
+                    monster.mover.direction = direction
+
+    def steer_store(self):
+        # steer_monsters for every monster in the EntityStore at once
+        store = self.store
+        layout = self.layout
+        size = layout.cell_size
+        first_col = (store.x - layout.offset_x - 1) // size
+        last_col = (store.x + store.width - layout.offset_x) // size
+        first_row = (store.y - layout.offset_y - 1) // size
+        last_row = (store.y + store.height - layout.offset_y) // size
+        inside = (first_col == last_col) & (first_row == last_row) \
+                 & (first_row >= 0) & (first_row < self.field.rows) \
+                 & (first_col >= 0) & (first_col < self.field.columns)
+        indices = np.flatnonzero(inside)
+        codes = np.frombuffer(self.field.codes, dtype=np.uint8)[
+            first_row[indices] * self.field.columns + first_col[indices]]
+        moving = codes != 0
+        store.direction[indices[moving]] = codes[moving]
+
+    def move_monsters(self, delta_time: int):
+        store = self.store
+        if self.navigator is not None:
+            self.steer_store()
+        store.update(delta_time)
+        store.clamp_all()
+        # Back up and turn until clear of the walls, like hit_walls re-testing after every backup
+        for _ in range(4):
+            hit = store.wall_hits(self.wall_mask, self.layout)
+            if not hit.any():
+                break
+            store.backup(hit)
+            store.random_directions(hit)
+        store.push()
+
+    def catcher(self):
+        # The monster touching Pac-Man, or None
+        if self.store is not None:
+            hits = self.store.intersecting(self.pacman.sprite.bbox())
+            return self.store.entities[hits[0]] if len(hits) > 0 else None
+        for monster in self.monsters:
+            if monster.sprite.overlaps(self.pacman.sprite):
+                return monster
+        return None
+
+    def caught(self):
+        return self.catcher() is not None
+
+    def step(self, delta_time: int):
+        # events only holds what happened during this step
+        self.events.clear()
+        if self.state is not GameState.PLAYING:
+            return
+        self.ticks += 1
+        if self.recorder is not None:
+            self.recorder.record_step(delta_time)
+        profiler = self.profiler
+        start = perf_counter() if profiler is not None else 0
+        if self.navigator is not None:
+            self.update_target()
+
+        if self.store is None:
+            if self.navigator is not None:
+                self.steer_monsters()
+            for entity in self.entities:
+                entity.update(delta_time)
+            if profiler is not None:
+                start = profiler.lap('move', start)
+
+            for entity in self.entities:
+                self.hit_walls(entity)
+        else:
+            self.pacman.update(delta_time)
+            if profiler is not None:
+                start = profiler.lap('move', start)
+            # The store moves and collides the monsters in one pass, it all counts as walls
+            self.hit_walls(self.pacman)
+            self.move_monsters(delta_time)
+        if profiler is not None:
+            start = profiler.lap('walls', start)
+
+        self.eat_pills()
+        if profiler is not None:
+            start = profiler.lap('pills', start)
+
+        caught = self.caught()
+        if profiler is not None:
+            profiler.lap('caught', start)
+        if caught:
+            self.state = GameState.LOST
+            self.events.append(GameEvent.CAUGHT)
+            return
+
+        if self.number_of_pills == 0:
+            self.state = GameState.WON
+            self.events.append(GameEvent.WON)
@@ -0,0 +1,162 @@
+import argparse
+import json
+import os
+from time import perf_counter, strftime
+
+from pacman_lib import *
+from mazegen import generate_level
+
+RECORDING_PATH = 'recordings'
+RECORD_ENV = 'PACMAN_RECORD'
+# Saving into RECORDING_PATH deletes the oldest recordings beyond this many
+RECORDING_LIMIT = 50
+
+
+def snapshot(engine: PacmanEngine):
+    # What a replay has to reproduce exactly
+    return {'state': engine.state.value, 'ticks': engine.ticks, 'pills_eaten': engine.pills_eaten,
+            'pills_left': engine.number_of_pills,
+            'entities': [[entity.sprite.x, entity.sprite.y, entity.mover.direction.value]
+                         for entity in engine.entities]}
+
+
+class Recorder:
+    # A game is its seed, its options, how long each step was and which way
+    # Pac-Man was turned before which step. Nothing else has to be stored.
+    def __init__(self) -> None:
+        super().__init__()
+        self.seed = None
+        self.options = {}
+        self.grid = None
+        self.level = None
+        self.recipe = None
+        self.steps = []
+        self.turns = []
+        self.final = None
+
+    def attach(self, engine: PacmanEngine):
+        # Before the engine's first step, or the recording would miss its start
+        engine.recorder = self
+        self.restart(engine)
+        return self
+
+    def restart(self, engine: PacmanEngine):
+        self.seed = engine.seed
+        self.options = {'grid_collisions': engine.grid_collisions, 'vectorized': engine.store is not None,
+                        'chase': engine.chase}
+        self.grid = engine.source_grid
+        # Levels are stored by path, a recording stays small however big the maze
+        self.level = engine.level.path if engine.level is not None else None
+        # A generated maze has no file, it is made again from the generator's arguments
+        self.recipe = engine.level.recipe if engine.level is not None else None
+        self.steps = []
+        self.turns = []
+        self.final = None
+
+    def record_step(self, delta_time: int):
+        # Run-length encoded, a fixed step game is a single [step, count] pair
+        if self.steps and self.steps[-1][0] == delta_time:
+            self.steps[-1][1] += 1
+        else:
+            self.steps.append([delta_time, 1])
+
+    def record_turn(self, tick: int, direction: Direction):
+        self.turns.append([tick, direction.value])
+
+    def finish(self, engine: PacmanEngine):
+        self.final = snapshot(engine)
+        return self
+
+    @property
+    def ticks(self):
+        return sum(count for delta_time, count in self.steps)
+
+    def to_json(self):
+        return {'version': 1, 'seed': self.seed, 'options': self.options, 'grid': self.grid,
+                'level': self.level, 'recipe': self.recipe, 'steps': self.steps, 'turns': self.turns, 'final': self.final}
+
+    @classmethod
+    def from_json(cls, data: dict):
+        recording = cls()
+        recording.seed = data['seed']
+        recording.options = data['options']
+        recording.grid = data['grid']
+        recording.level = data.get('level')
+        recording.recipe = data.get('recipe')
+        recording.steps = data['steps']
+        recording.turns = data['turns']
+        recording.final = data['final']
+        return recording
+
+    def save(self, path: str = None):
+        in_recordings = path is None
+        if in_recordings:
+            os.makedirs(RECORDING_PATH, exist_ok=True)
+            path = os.path.join(RECORDING_PATH, f'{strftime("%Y%m%d-%H%M%S")}-{self.seed}.json')
+        with open(path, 'w') as file:
+            json.dump(self.to_json(), file)
+        if in_recordings:
+            prune_recordings()
+        return path
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path) as file:
+            return cls.from_json(json.load(file))
+
+    def new_engine(self):
+        if self.recipe is not None:
+            level = generate_level(**self.recipe)
+        else:
+            level = Level.load(self.level) if self.level is not None else None
+        return PacmanEngine(grid=self.grid, seed=self.seed, level=level, **self.options)
+
+
+def prune_recordings(limit: int = RECORDING_LIMIT, directory: str = RECORDING_PATH):
+    # Names start with the time they were saved, so sorting them puts the oldest first
+    names = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    for name in names[:max(0, len(names) - limit)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+def replay(recording: Recorder, profiler=None):
+    # As fast as the engine steps, nothing is drawn
+    engine = recording.new_engine()
+    engine.profiler = profiler
+    turns = recording.turns
+    next_turn = 0
+    for delta_time, count in recording.steps:
+        for _ in range(count):
+            while next_turn < len(turns) and turns[next_turn][0] <= engine.ticks:
+                engine.turn(Direction(turns[next_turn][1]))
+                next_turn += 1
+            engine.step(delta_time)
+    return engine
+
+
+def verify(recording: Recorder, engine: PacmanEngine):
+    # The names of everything that came out differently, empty when the replay matches
+    actual = snapshot(engine)
+    return [name for name, value in recording.final.items() if actual[name] != value]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay recorded games headlessly and check their outcome')
+    parser.add_argument('recordings', nargs='+')
+    parser.add_argument('--repeat', type=int, default=1, help='replay each one this many times, for timing')
+    args = parser.parse_args()
+    failed = 0
+    for path in args.recordings:
+        recording = Recorder.load(path)
+        start = perf_counter()
+        for _ in range(args.repeat):
+            engine = replay(recording)
+        elapsed = perf_counter() - start
+        mismatches = verify(recording, engine) if recording.final is not None else ['no final state']
+        failed += bool(mismatches)
+        print(f'{path}: {recording.ticks} ticks, {recording.ticks * args.repeat / elapsed:,.0f} ticks/s, '
+              + ('ok' if not mismatches else 'MISMATCH in ' + ', '.join(mismatches)))
+    raise SystemExit(1 if failed else 0)
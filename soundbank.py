@@ -0,0 +1,110 @@
+import os
+from time import monotonic
+
+try:
+    import pygame.mixer as mixer
+    from pygame import error as MixerError
+except ImportError:
+    mixer = None
+    MixerError = OSError
+
+SOUND_PATH = 'sounds'
+
+# Effects decoded into memory up front, by name
+GAME_SOUNDS = {
+    'pill': 'zap.ogg',
+    'caught': 'explosion.ogg',
+    'won': 'laserfire.ogg',
+}
+THEME = 'theme.ogg'
+
+
+class SoundBank:
+    def __init__(self, sound_path: str = SOUND_PATH, channels: int = 8,
+                 frequency: int = 44100, buffer: int = 512) -> None:
+        super().__init__()
+        self.sound_path = sound_path
+        self._sounds = {}
+        self._channels = []
+        self._started = {}
+        self._queued = []
+        self._cooldowns = {}
+        self._last_played = {}
+        self._enabled = False
+        if mixer is None:
+            return
+        try:
+            # A small buffer keeps the delay between trigger and sound short
+            mixer.init(frequency=frequency, buffer=buffer)
+        except MixerError:
+            return
+        mixer.set_num_channels(channels)
+        self._channels = [mixer.Channel(i) for i in range(channels)]
+        self._enabled = True
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    def __contains__(self, name):
+        return name in self._sounds
+
+    def load(self, name: str, file: str, volume: float = 1.0, cooldown: float = 0):
+        # Decoded once here, so playing never touches the disk or the decoder
+        if self._enabled:
+            sound = mixer.Sound(os.path.join(self.sound_path, file))
+            sound.set_volume(volume)
+            self._sounds[name] = sound
+            self._cooldowns[name] = cooldown
+        return self
+
+    def load_all(self, sounds: dict = None):
+        for name, file in (GAME_SOUNDS if sounds is None else sounds).items():
+            self.load(name, file)
+        return self
+
+    def trigger(self, name: str):
+        # Queued until flush, so a burst of the same event in one frame is heard once
+        if name in self._sounds and name not in self._queued:
+            self._queued.append(name)
+
+    def flush(self):
+        now = monotonic()
+        for name in self._queued:
+            if now - self._last_played.get(name, -1e9) >= self._cooldowns[name]:
+                self.play(name, now)
+        self._queued.clear()
+
+    def play(self, name: str, now: float = None):
+        if not self._enabled or name not in self._sounds:
+            return None
+        now = monotonic() if now is None else now
+        channel = self._free_channel()
+        channel.play(self._sounds[name])
+        self._started[channel] = now
+        self._last_played[name] = now
+        return channel
+
+    def _free_channel(self):
+        for channel in self._channels:
+            if not channel.get_busy():
+                return channel
+        # Every voice is busy, steal the one that has been playing longest
+        return min(self._channels, key=lambda channel: self._started.get(channel, 0))
+
+    def play_music(self, file: str = THEME, loops: int = -1, volume: float = 0.5):
+        # The music module streams from disk instead of decoding the whole file
+        if self._enabled:
+            mixer.music.load(os.path.join(self.sound_path, file))
+            mixer.music.set_volume(volume)
+            mixer.music.play(loops)
+
+    def stop_music(self):
+        if self._enabled:
+            mixer.music.stop()
+
+    def stop_all(self):
+        self._queued.clear()
+        if self._enabled:
+            mixer.stop()
+            mixer.music.stop()
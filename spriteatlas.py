@@ -0,0 +1,117 @@
+import json
+import mmap
+import os
+
+from PIL import Image
+
+from imagehelper import *
+
+ATLAS_PATH = 'images/game.atlas'
+
+# Everything the game screens load, as ('sized', path, width, height) or
+# ('sheet', path, columns, rows, width, height, transpose)
+GAME_ASSETS = [
+    ('sized', 'images/Originalpacmaze.png', 452, 500),
+    ('sized', 'images/pacup.png', 12, 12),
+    ('sized', 'images/pacdown.png', 12, 12),
+    ('sized', 'images/pacleft.png', 12, 12),
+    ('sized', 'images/pacright.png', 12, 12),
+    ('sized', 'images/pacclosed.png', 12, 12),
+    ('sized', 'images/redghost.png', 12, 12),
+    ('sized', 'images/yellowghost.png', 12, 12),
+    ('sized', 'images/greenghost.png', 12, 12),
+    ('sized', 'images/pinkghost.png', 12, 12),
+    ('sized', 'images/splashscreen.png', 800, 600),
+    ('sized', 'images/gameover.jpg', 800, 600),
+    ('sheet', 'images/alien_a_sheet.png', 2, 1, 32, 32, False),
+    ('sheet', 'images/alien_b_sheet.png', 2, 1, 32, 32, False),
+    ('sheet', 'images/alien_c_sheet.png', 2, 1, 32, 32, False),
+    ('sheet', 'images/alien_d_sheet.png', 2, 1, 32, 32, False),
+    ('sheet', 'images/explosion_sheet.png', 5, 1, 32, 32, False),
+]
+
+
+def _key_to_json(key):
+    path, size, transpose, resample, box = key
+    return [path, size[0], size[1], transpose, int(resample), list(box) if box is not None else None]
+
+
+def _key_from_json(value):
+    path, width, height, transpose, resample, box = value
+    return path, (width, height), transpose, Image.Resampling(resample), tuple(box) if box is not None else None
+
+
+def _source_stamp(path: str):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def build_atlas(assets: list = None, atlas_path: str = ATLAS_PATH):
+    # Offline step: decode and resample every asset once, then write the raw
+    # RGBA pixels back to back into one file with a JSON index next to it
+    assets = GAME_ASSETS if assets is None else assets
+    entries = []
+    sources = {}
+    offset = 0
+    with open(atlas_path, 'wb') as atlas_file:
+        for asset in assets:
+            if asset[0] == 'sized':
+                kind, path, width, height = asset
+                frames = [(ImageHelper.sized_key(path, width, height), ImageHelper.load_sized(path, width, height))]
+            else:
+                kind, path, columns, rows, width, height, transpose = asset
+                frames = ImageHelper.load_frames(path, columns, rows, width, height, transpose)
+            sources[path] = _source_stamp(path)
+            for key, image in frames:
+                pixels = image.convert('RGBA').tobytes()
+                atlas_file.write(pixels)
+                entries.append({'key': _key_to_json(key), 'offset': offset,
+                                'width': image.width, 'height': image.height})
+                offset += len(pixels)
+    with open(atlas_path + '.json', 'w') as index_file:
+        json.dump({'version': 1, 'sources': sources, 'entries': entries}, index_file)
+    return len(entries), offset
+
+
+class SpriteAtlas:
+    def __init__(self, atlas_path: str = ATLAS_PATH) -> None:
+        super().__init__()
+        with open(atlas_path + '.json') as index_file:
+            index = json.load(index_file)
+        # Read-only mapping, so every game process shares the same page cache pages
+        self._file = open(atlas_path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._entries = {}
+        fresh = {path for path, stamp in index['sources'].items()
+                 if os.path.isfile(path) and _source_stamp(path) == stamp}
+        for entry in index['entries']:
+            key = _key_from_json(entry['key'])
+            # A source image edited since the build is decoded normally instead
+            if key[0] in fresh:
+                self._entries[key] = (entry['offset'], entry['width'], entry['height'])
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_image(self, key):
+        offset, width, height = self._entries[key]
+        pixels = memoryview(self._map)[offset:offset + width * height * 4]
+        return Image.frombuffer('RGBA', (width, height), pixels, 'raw', 'RGBA', 0, 1)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    @classmethod
+    def load(cls, atlas_path: str = ATLAS_PATH):
+        if os.path.isfile(atlas_path) and os.path.isfile(atlas_path + '.json'):
+            return cls(atlas_path)
+        return None
+
+
+if __name__ == '__main__':
+    count, size = build_atlas()
+    print(f'Wrote {count} images, {size} bytes to {ATLAS_PATH}')
@@ -1,11 +1,50 @@
 from __future__ import annotations
 
-import random
-from tkinter import *
 from enum import Enum
+from typing import TYPE_CHECKING
+
+# tkinter is only needed for type hints, so the sprite classes can also be
+# used by headless code that never opens a display
+if TYPE_CHECKING:
+    from tkinter import Canvas, PhotoImage
+
+NW = 'nw'
+
+
+class ImageHandle:
+    # A PhotoImage with its size read once. PhotoImage.width() and height() are
+    # Tcl round-trips, and the Sprite.image setter asks for both every time.
+    # Tk takes the handle anywhere it takes the image, through its name.
+    __slots__ = ('_photo', '_width', '_height')
+
+    def __init__(self, photo: PhotoImage, width: int = None, height: int = None) -> None:
+        self._photo = photo
+        self._width = photo.width() if width is None else width
+        self._height = photo.height() if height is None else height
+
+    @property
+    def photo(self):
+        return self._photo
+
+    def width(self):
+        return self._width
+
+    def height(self):
+        return self._height
+
+    def __str__(self) -> str:
+        return str(self._photo)
+
+    def __getattr__(self, name):
+        # Anything else a PhotoImage offers, e.g. zoom or subsample
+        if name == '_photo':
+            raise AttributeError(name)
+        return getattr(self._photo, name)
 
 
 class Point:
+    __slots__ = ('_x', '_y')
+
     def __init__(self, x: int, y: int) -> None:
         super().__init__()
         self.x = x
@@ -68,6 +107,31 @@ class Clamp:
         cls.clamp_y(sprite, top_limit, bottom_limit)
 
 
+class CellLayout:
+    def __init__(self, cell_size: int = 16, offset_x: int = 0, offset_y: int = 0) -> None:
+        super().__init__()
+        self.cell_size = cell_size
+        self.offset_x = offset_x
+        self.offset_y = offset_y
+
+    def cell_at(self, x: int, y: int):
+        return (y - self.offset_y) // self.cell_size, (x - self.offset_x) // self.cell_size
+
+    def cell_bbox(self, row: int, col: int):
+        left = self.offset_x + col * self.cell_size
+        top = self.offset_y + row * self.cell_size
+        return left, top, left + self.cell_size, top + self.cell_size
+
+    def cells_touching(self, box):
+        # Same inclusive edges as Sprite.intersects, so a box that only touches
+        # the edge of a cell still counts as overlapping it.
+        first_col = (box[0] - self.offset_x - 1) // self.cell_size
+        last_col = (box[2] - self.offset_x) // self.cell_size
+        first_row = (box[1] - self.offset_y - 1) // self.cell_size
+        last_row = (box[3] - self.offset_y) // self.cell_size
+        return first_row, last_row, first_col, last_col
+
+
 class Direction(Enum):
     LEFT = "Left"
     UP = "Up"
@@ -77,22 +141,75 @@ class Direction(Enum):
 
 
 class Sprite:
+    # Slotted because every maze cell is a Sprite, there can be hundreds of thousands of them
+    __slots__ = ('_x', '_y', '_width', '_height', '_border_color', '_border_width', '_fill_color',
+                 '_image', '_canvas', '_items', '_moved', '_restyled')
+
     def __init__(self, x: int = 0, y: int = 0, width: int = 25,
                  height: int = 25,
                  border_color: str = 'black', border_width: int = 2,
                  fill_color: str = '', image: PhotoImage = None) -> None:
         super().__init__()
-        self.x = x
-        self.y = y
+        self._x = x
+        self._y = y
         self._width = width
         self._height = height
-        self.border_color = border_color
-        self.border_width = border_width
-        self.fill_color = fill_color
+        self._border_color = border_color
+        self._border_width = border_width
+        self._fill_color = fill_color
         self._image = image
         if self._image is not None:
             self._width = self._image.width()
             self._height = self._image.height()
+        self._canvas = None
+        self._items = None
+        self._moved = False
+        self._restyled = False
+
+    @property
+    def x(self):
+        return self._x
+
+    @x.setter
+    def x(self, value: int):
+        self._x = value
+        self._moved = True
+
+    @property
+    def y(self):
+        return self._y
+
+    @y.setter
+    def y(self, value: int):
+        self._y = value
+        self._moved = True
+
+    @property
+    def border_color(self):
+        return self._border_color
+
+    @border_color.setter
+    def border_color(self, value: str):
+        self._border_color = value
+        self._restyled = True
+
+    @property
+    def border_width(self):
+        return self._border_width
+
+    @border_width.setter
+    def border_width(self, value: int):
+        self._border_width = value
+        self._restyled = True
+
+    @property
+    def fill_color(self):
+        return self._fill_color
+
+    @fill_color.setter
+    def fill_color(self, value: str):
+        self._fill_color = value
+        self._restyled = True
 
     @property
     def center_x(self):
@@ -128,6 +245,7 @@ class Sprite:
         if self._image is not None:
             raise Exception('cannot set width if sprite has image')
         self._width = value
+        self._moved = True
 
     @property
     def height(self):
@@ -138,6 +256,7 @@ class Sprite:
         if self._image is not None:
             raise Exception('cannot set height if sprite has image')
         self._height = value
+        self._moved = True
 
     @property
     def image(self):
@@ -145,6 +264,9 @@ class Sprite:
 
     @image.setter
     def image(self, value):
+        if value is not self._image:
+            self._moved = True
+            self._restyled = True
         self._image = value
         self._width = self._image.width()
         self._height = self._image.height()
@@ -181,6 +303,11 @@ class Sprite:
     def bottom(self, value):
         self.y = value - self._height
 
+    @property
+    def sprite(self):
+        # Itself, so a plain Sprite goes wherever something with a sprite does
+        return self
+
     def draw(self, canvas: Canvas):
         canvas.create_rectangle(self.left, self.top,
                                 self.right, self.bottom,
@@ -190,6 +317,35 @@ class Sprite:
         canvas.create_image(self.x, self.y, anchor=NW,
                             image=self._image)
 
+    def render(self, canvas: Canvas, tags: str = None):
+        # Retained drawing: the canvas items are created once and only
+        # touched again when the sprite has moved or changed its look.
+        if self._items is None or self._canvas is not canvas:
+            self._canvas = canvas
+            self._items = (canvas.create_rectangle(self.left, self.top,
+                                                   self.right, self.bottom,
+                                                   outline=self._border_color,
+                                                   fill=self._fill_color,
+                                                   width=self._border_width, tags=tags),
+                           canvas.create_image(self._x, self._y, anchor=NW,
+                                               image=self._image, tags=tags))
+        else:
+            if self._moved:
+                canvas.coords(self._items[0], self.left, self.top, self.right, self.bottom)
+                canvas.coords(self._items[1], self._x, self._y)
+            if self._restyled:
+                canvas.itemconfig(self._items[0], outline=self._border_color,
+                                  fill=self._fill_color, width=self._border_width)
+                canvas.itemconfig(self._items[1], image=self._image)
+        self._moved = False
+        self._restyled = False
+
+    def erase(self, canvas: Canvas):
+        if self._items is not None and self._canvas is canvas:
+            canvas.delete(*self._items)
+        self._canvas = None
+        self._items = None
+
     def increment_x(self, distance: int):
         self.x += distance
 
@@ -200,21 +356,48 @@ class Sprite:
         t = (self.left, self.top, self.right, self.bottom)
         return t
 
+    # The collision checks below work on raw coordinates and build no objects,
+    # they are called thousands of times a frame. Edges count as touching.
     def intersects(self, box):
-        a = self
-        b = Sprite(box[0], box[1], box[2] - box[0], box[3] - box[1])
-        return not (a.right < b.left or a.left > b.right
-                    or a.bottom < b.top or a.top > b.bottom)
+        return not (self._x + self._width < box[0] or self._x > box[2]
+                    or self._y + self._height < box[1] or self._y > box[3])
+
+    def intersects_rect(self, left: int, top: int, right: int, bottom: int):
+        return not (self._x + self._width < left or self._x > right
+                    or self._y + self._height < top or self._y > bottom)
+
+    def overlaps(self, other: Sprite):
+        return not (self._x + self._width < other._x or self._x > other._x + other._width
+                    or self._y + self._height < other._y or self._y > other._y + other._height)
+
+    def intersecting(self, boxes: list):
+        left = self._x
+        top = self._y
+        right = left + self._width
+        bottom = top + self._height
+        return [index for index, box in enumerate(boxes)
+                if not (right < box[0] or left > box[2] or bottom < box[1] or top > box[3])]
+
+    def overlapping(self, sprites: list):
+        left = self._x
+        top = self._y
+        right = left + self._width
+        bottom = top + self._height
+        return [index for index, other in enumerate(sprites)
+                if not (right < other._x or left > other._x + other._width
+                        or bottom < other._y or top > other._y + other._height)]
 
     def contains(self, x: int, y: int):
-        return (x in range(self.left, self.right)) \
-               and (y in range(self.top, self.bottom))
+        return self._x <= x < self._x + self._width \
+               and self._y <= y < self._y + self._height
 
     def __str__(self) -> str:
-        return str(self.__dict__).replace('_', '')
+        return str({name: getattr(self, name) for name in self.__slots__}).replace('_', '')
 
 
 class Mover:
+    __slots__ = ('_sprite', '_direction', '_delay_time', '_speed', '_elapsed_time')
+
     def __init__(self, sprite: Sprite,
                  direction: Direction = Direction.RIGHT,
                  delay_time: int = 100, speed: int = 1):
@@ -227,7 +410,11 @@ class Mover:
     def update(self, delta_time: int):
         self._elapsed_time += delta_time
         if self._elapsed_time >= self._delay_time:
-            self._elapsed_time = 0
+            # Keep the leftover time so the average speed does not depend on
+            # how evenly update is called, but never bank more than one move
+            self._elapsed_time -= self._delay_time
+            if self._elapsed_time >= self._delay_time:
+                self._elapsed_time = 0
             if self._direction == Direction.LEFT:
                 self._sprite.increment_x(-self._speed)
             elif self._direction == Direction.RIGHT:
@@ -249,6 +436,14 @@ class Mover:
     def direction(self, value: Direction):
         self._direction = value
 
+    @property
+    def elapsed_time(self):
+        return self._elapsed_time
+
+    @elapsed_time.setter
+    def elapsed_time(self, value: int):
+        self._elapsed_time = value
+
     @property
     def delay_time(self):
         return self._delay_time
@@ -277,6 +472,8 @@ class Mover:
 
 
 class Animation:
+    __slots__ = ('_images', '_frame_delay', '_current_frame', '_elapsed_time', '_paused', '_sprite', '_loop')
+
     def __init__(self, sprite: Sprite, images: list,
                  frame_delay: int = 100, loop: bool = True) -> None:
         self._images = images
@@ -298,19 +495,24 @@ class Animation:
     def update(self, deltaTime: int):
         if self._paused:
             self._elapsed_time = 0
-        else:
-            self._elapsed_time += deltaTime
-            if self._elapsed_time > self._frame_delay:
-                self._elapsed_time = 0
-                self._current_frame += 1
-                if self._current_frame >= len(self._images):
-                    if not self._loop:
-                        self._paused = True
-                        self.current_frame = len(self._images) - 1
-                    else:
-                        self._current_frame = 0
-
-            self._sprite.image = self._images[self._current_frame]
+            return
+        self._elapsed_time += deltaTime
+        if self._elapsed_time < self._frame_delay or not self._images:
+            return
+        # Frames follow the clock, the leftover time counts towards the next one
+        frames = self._elapsed_time // self._frame_delay if self._frame_delay > 0 else 1
+        self._elapsed_time -= frames * self._frame_delay
+        frame = self._current_frame + frames
+        if frame >= len(self._images):
+            if not self._loop:
+                self._paused = True
+                frame = len(self._images) - 1
+            else:
+                frame %= len(self._images)
+        # The sprite is only touched when a different picture is due
+        if frame != self._current_frame:
+            self._current_frame = frame
+            self._sprite.image = self._images[frame]
 
     @property
     def paused(self):
@@ -346,7 +548,12 @@ class Animation:
 
     @images.setter
     def images(self, image_list: list):
-        self._images = image_list
+        if image_list is not self._images:
+            self._images = image_list
+            if self._current_frame >= len(image_list):
+                self._current_frame = 0
+            if image_list:
+                self._sprite.image = image_list[self._current_frame]
 
     def __str__(self) -> str:
         return "frame delay: {}, current frame: {}, elapsed time: {}".format(self._frame_delay, self._current_frame,
@@ -371,6 +578,12 @@ class AnimatedSprite:
     def draw(self, canvas: Canvas):
         self._sprite.draw(canvas)
 
+    def render(self, canvas: Canvas):
+        self._sprite.render(canvas)
+
+    def erase(self, canvas):
+        self._sprite.erase(canvas)
+
     def update(self, delta_time):
         self._animation.update(delta_time)
 
@@ -401,6 +614,12 @@ class MovingSprite:
     def draw(self, canvas):
         self._sprite.draw(canvas)
 
+    def render(self, canvas):
+        self._sprite.render(canvas)
+
+    def erase(self, canvas):
+        self._sprite.erase(canvas)
+
     def update(self, delta_time):
         self._mover.update(delta_time)
         Clamp.clamp_all(self._sprite, self.clamp.left_limit, self.clamp.right_limit, self.clamp.top_limit,
@@ -440,6 +659,12 @@ class AnimatedMovingSprite:
     def draw(self, canvas):
         self._sprite.draw(canvas)
 
+    def render(self, canvas):
+        self._sprite.render(canvas)
+
+    def erase(self, canvas):
+        self._sprite.erase(canvas)
+
     def update(self, delta_time):
         self._mover.update(delta_time)
         self._animation.update(delta_time)
@@ -514,6 +739,12 @@ class AnimatedHorizontalMovingSprite:
     def draw(self, canvas):
         self._sprite.draw(canvas)
 
+    def render(self, canvas):
+        self._sprite.render(canvas)
+
+    def erase(self, canvas):
+        self._sprite.erase(canvas)
+
     def update(self, delta_time):
         self._mover.update(delta_time)
 
@@ -609,6 +840,12 @@ class Animated4WayMovingSprite:
     def draw(self, canvas):
         self._animated_moving_sprite.draw(canvas)
 
+    def render(self, canvas):
+        self._animated_moving_sprite.render(canvas)
+
+    def erase(self, canvas):
+        self._animated_moving_sprite.erase(canvas)
+
     def update(self, delta_time):
         self._animated_moving_sprite.update(delta_time)
         if self.mover.direction == Direction.LEFT:
@@ -673,6 +910,12 @@ class AnimatedHorizontalBouncer:
     def draw(self, canvas):
         self._sprite.draw(canvas)
 
+    def render(self, canvas):
+        self._sprite.render(canvas)
+
+    def erase(self, canvas):
+        self._sprite.erase(canvas)
+
     def update(self, delta_time):
         self._mover.update(delta_time)
         if self._mover.direction == Direction.LEFT and \
@@ -745,6 +988,12 @@ class AnimatedHorizontalRepeater:
     def draw(self, canvas):
         self._sprite.draw(canvas)
 
+    def render(self, canvas):
+        self._sprite.render(canvas)
+
+    def erase(self, canvas):
+        self._sprite.erase(canvas)
+
     def update(self, delta_time):
         self._mover.update(delta_time)
         if self._mover.direction == Direction.LEFT:
@@ -814,6 +1063,12 @@ class AnimatedVerticalBouncer:
     def draw(self, canvas):
         self._sprite.draw(canvas)
 
+    def render(self, canvas):
+        self._sprite.render(canvas)
+
+    def erase(self, canvas):
+        self._sprite.erase(canvas)
+
     def update(self, delta_time):
         self._mover.update(delta_time)
         if self._mover.direction == Direction.UP and \
@@ -887,6 +1142,12 @@ class AnimatedVerticalRepeater:
     def draw(self, canvas):
         self._sprite.draw(canvas)
 
+    def render(self, canvas):
+        self._sprite.render(canvas)
+
+    def erase(self, canvas):
+        self._sprite.erase(canvas)
+
     def update(self, delta_time):
         self._mover.update(delta_time)
 